@@ -53,6 +53,9 @@ def interpret_macd(macd_data):
     else:
         return {"status": "neutral", "strength": 0, "description": f"MACD ({macd_value:.2f}) showing mixed signals"}
 
+# (status, wording) for price above / below a moving average
+_MA_SIDES = {True: ("bullish", "above"), False: ("bearish", "below")}
+
 def interpret_moving_averages(price, sma_20, sma_50, sma_100):
     """Analyze price relationship to multiple moving averages"""
     if isinstance(sma_20, list) and sma_20:
@@ -64,20 +67,9 @@ def interpret_moving_averages(price, sma_20, sma_50, sma_100):
     results = []
     
     # Check price relative to moving averages
-    if price > sma_20:
-        results.append({"status": "bullish", "strength": 1, "description": f"Price (${price:.2f}) above SMA20 (${sma_20:.2f})"})
-    else:
-        results.append({"status": "bearish", "strength": 1, "description": f"Price (${price:.2f}) below SMA20 (${sma_20:.2f})"})
-        
-    if price > sma_50:
-        results.append({"status": "bullish", "strength": 1, "description": f"Price (${price:.2f}) above SMA50 (${sma_50:.2f})"})
-    else:
-        results.append({"status": "bearish", "strength": 1, "description": f"Price (${price:.2f}) below SMA50 (${sma_50:.2f})"})
-        
-    if price > sma_100:
-        results.append({"status": "bullish", "strength": 1, "description": f"Price (${price:.2f}) above SMA100 (${sma_100:.2f})"})
-    else:
-        results.append({"status": "bearish", "strength": 1, "description": f"Price (${price:.2f}) below SMA100 (${sma_100:.2f})"})
+    for name, sma in (("SMA20", sma_20), ("SMA50", sma_50), ("SMA100", sma_100)):
+        status, side = _MA_SIDES[price > sma]
+        results.append({"status": status, "strength": 1, "description": f"Price (${price:.2f}) {side} {name} (${sma:.2f})"})
     
     # Check moving average alignment
     if sma_20 > sma_50 > sma_100:
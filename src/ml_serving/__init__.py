@@ -0,0 +1,7 @@
+"""
+Model serving package for QSBets.
+Loads the project .env once so every module and backend client sees the same settings.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
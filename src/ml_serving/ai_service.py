@@ -7,15 +7,17 @@ import asyncio
 import time
 from typing import Any, Dict, Callable, List, Union
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.output_parsers import StrOutputParser
 from langchain.schema.messages import SystemMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate
-
-from storage.cache import HOURS2_TTL, cached
-from ml_serving.config import FIN_R1_ARGS
-from ml_serving.prompts import CONSULT_PROMPT_V7, OWNERSHIP_PROMPT, STOCK_CONSULT_SYSTEM_PROMPT, STOCK_SUMMARIZE_SYSTEM_PROMPT, SUMMARIZE_PROMPT_V3
-from ml_serving.utils import JsonOutputParser, SummaryResponse, dump_failed_text, extract_json_from_response, get_chat
+from langchain_core.runnables import RunnableLambda
+
+from storage.cache import DAY_TTL, HOURS2_TTL, cache_instance, cached
+from storage.semantic_cache import semantic_cached
+from ml_serving.config import FIN_R1_ARGS, MLX_MODEL_PATH, SUMMARY_MAX_INPUT_TOKENS, SUMMARY_MAX_TOKENS
+from ml_serving.prompts import BATCH_DOCUMENT_TEMPLATE, CONSULT_PROMPT_V7, OWNERSHIP_PROMPT, STOCK_CONSULT_SYSTEM_PROMPT, STOCK_SUMMARIZE_SYSTEM_PROMPT, SUMMARIZE_PROMPT_V5_BATCH, SUMMARY_JSON_REMINDER, format_summarize_prompt
+from ml_serving.retry import retry_transient
+from ml_serving.utils import JsonOutputParser, SummaryBatch, SummaryResponse, batch_summaries, content_key, dedupe_texts, dump_failed_text, estimate_tokens, extract_json_from_response, get_chat, parse_summary, split_texts, truncate_to_tokens, with_json_schema
 from logger import get_logger
 
 logger = get_logger("qsbets")
@@ -23,6 +25,39 @@ logger = get_logger("qsbets")
 # Default settings
 DEFAULT_MAX_RETRIES = 3
 DEFAULT_BASE_DELAY = 2.0
+DEFAULT_SUMMARY_BATCH_SIZE = 5
+DEFAULT_SUMMARY_CONCURRENCY = 4
+SUMMARY_CACHE_COLLECTION = "summary_cache"
+# Shared so every request starts with byte-identical system tokens that backends can prefix-cache
+SUMMARIZE_SYSTEM_MESSAGE = SystemMessage(content=STOCK_SUMMARIZE_SYSTEM_PROMPT)
+SUMMARY_JSON_REMINDER_MESSAGE = HumanMessage(content=SUMMARY_JSON_REMINDER)
+# Leaves room for the generated JSON inside the 16k context used by get_chat
+DEFAULT_MAX_PROMPT_TOKENS = 12000
+
+# Map: Summarize each chunk
+MAP_REDUCE_MAP_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", STOCK_SUMMARIZE_SYSTEM_PROMPT),
+        ("user", """Summarize the following text for the stock {stock}:
+    {text}
+    
+    Summary:"""),
+    ]
+)
+# Reduce: Combine summaries
+MAP_REDUCE_REDUCE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", STOCK_SUMMARIZE_SYSTEM_PROMPT),
+        ("user", """You are given a set of summaries extracted from a longer text about stock news.
+    Create a concise, technical, comprehensive summary that combines all the important information about this stock {stock}.
+    Focus on quantitative data: revenue growth percentages, earnings, EPS, P/E ratios, margins, risks, and opportunities, year-over-year comparisons.
+    
+    SUMMARIES:
+    {summaries}
+    
+    COMPREHENSIVE SUMMARY:"""),
+    ]
+)
 
 @cached(HOURS2_TTL)
 def map_reduce_summarize(
@@ -40,56 +75,19 @@ def map_reduce_summarize(
         model=model
     )
 
-    # Create text splitter for chunking
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=100,
-        separators=["\n\n", "\n", " ", ""],
-        keep_separator=False,
-    )
-
     # Split documents into chunks
-    splits = []
-    for doc in documents:
-        chunks = text_splitter.split_text(doc.page_content)
-        for chunk in chunks:
-            splits.append(Document(page_content=chunk, metadata=doc.metadata))
+    splits = split_texts([doc.page_content for doc in documents], chunk_size)
 
-    logger.info(f"Split {len(documents)} documents into {len(splits)} chunks")
+    # Items sharing boilerplate (disclaimers, sign-up blocks) split into identical chunks,
+    # summarize each distinct chunk once; the reduce gains nothing from repeated summaries
+    chunks, _ = dedupe_texts(splits)
+    logger.info(f"Split {len(documents)} documents into {len(splits)} chunks, {len(chunks)} distinct")
 
-    # Map: Summarize each chunk
-    map_template = """Summarize the following text for the stock {stock}:
-    {text}
-    
-    Summary:"""
-
-    messages = ChatPromptTemplate.from_messages(
-        [
-            ("system", STOCK_SUMMARIZE_SYSTEM_PROMPT),
-            ("user", map_template),
-        ]
-    )
-    map_chain = messages | llm | callback
+    map_chain = MAP_REDUCE_MAP_PROMPT | llm | callback
     map_chain = map_chain.with_retry(
         stop_after_attempt=DEFAULT_MAX_RETRIES,
     )
-    # Reduce: Combine summaries
-    reduce_template = """You are given a set of summaries extracted from a longer text about stock news.
-    Create a concise, technical, comprehensive summary that combines all the important information about this stock {stock}.
-    Focus on quantitative data: revenue growth percentages, earnings, EPS, P/E ratios, margins, risks, and opportunities, year-over-year comparisons.
-    
-    SUMMARIES:
-    {summaries}
-    
-    COMPREHENSIVE SUMMARY:"""
-
-    messages = ChatPromptTemplate.from_messages(
-        [
-            ("system", STOCK_SUMMARIZE_SYSTEM_PROMPT),
-            ("user", reduce_template)
-        ]
-    )
-    reduce_chain = messages | llm | callback
+    reduce_chain = MAP_REDUCE_REDUCE_PROMPT | llm | callback
     reduce_chain = reduce_chain.with_retry(
         stop_after_attempt=DEFAULT_MAX_RETRIES,
     )
@@ -97,11 +95,11 @@ def map_reduce_summarize(
     logger.info("Starting map step...")
 
     async def process_chunks_in_batches():
-        mapped_results = [None] * len(splits)  # Pre-allocate result list
+        mapped_results = [None] * len(chunks)  # Pre-allocate result list
 
         # Process in batches to limit concurrent model loads
-        for batch_start in range(0, len(splits), batch_size):
-            batch_end = min(batch_start + batch_size, len(splits))
+        for batch_start in range(0, len(chunks), batch_size):
+            batch_end = min(batch_start + batch_size, len(chunks))
             logger.info(
                 f"Processing batch {batch_start//batch_size + 1}, chunks {batch_start+1}-{batch_end}"
             )
@@ -110,7 +108,7 @@ def map_reduce_summarize(
             batch_tasks = []
             for i in range(batch_start, batch_end):
                 task = asyncio.create_task(
-                    map_chain.ainvoke({"text": splits[i].page_content, "stock": stock})
+                    map_chain.ainvoke({"text": chunks[i], "stock": stock})
                 )
                 batch_tasks.append((i, task))
 
@@ -118,13 +116,13 @@ def map_reduce_summarize(
             for i, task in batch_tasks:
                 try:
                     result = await task
-                    logger.info(f"Chunk {i+1}/{len(splits)} processed")
+                    logger.info(f"Chunk {i+1}/{len(chunks)} processed")
                     mapped_results[i] = result
                 except Exception as e:
                     logger.error(f"Error processing chunk {i+1}: {e}")
                     # Fall back to sync processing for failed chunks
                     result = map_chain.invoke(
-                        {"text": splits[i].page_content, "stock": stock}
+                        {"text": chunks[i], "stock": stock}
                     )
                     mapped_results[i] = result
                     logger.info(f"Chunk {i+1} processed (sequential fallback)")
@@ -133,7 +131,7 @@ def map_reduce_summarize(
         return [r for r in mapped_results if r is not None]
 
     # Choose processing strategy based on number of chunks
-    if len(splits) > 20:  # Many chunks - use batched approach
+    if len(chunks) > 20:  # Many chunks - use batched approach
         mapped_results = asyncio.run(process_chunks_in_batches())
     else:  # Fewer chunks - can use original approach
         mapped_results = asyncio.run(
@@ -149,35 +147,87 @@ def map_reduce_summarize(
     return result
 
 
+def _summary_messages(text: str) -> list:
+    return [
+        SUMMARIZE_SYSTEM_MESSAGE,
+        HumanMessage(content=format_summarize_prompt(text))
+    ]
+
+
+def _summary_model(backend: str, model: str):
+    return with_json_schema(get_chat(backend=backend, model=model), backend, SummaryResponse,
+                            max_tokens=SUMMARY_MAX_TOKENS)
+
+
+def _strict_summary_model(model_server, backend: str, model: str):
+    """The summary model with sampling turned off, for the corrective retry"""
+    if backend == "ollama":
+        # Ollama only reads temperature from options, which replace the configured num_ctx
+        num_ctx = get_chat(backend=backend, model=model).num_ctx
+        return model_server.bind(options={"num_ctx": num_ctx, "temperature": 0.0})
+    return model_server.bind(temperature=0.0)
+
+
+@retry_transient(DEFAULT_MAX_RETRIES, DEFAULT_BASE_DELAY)
+def _invoke_summary(model_server, messages: list) -> Dict[str, Any]:
+    response = model_server.invoke(messages)
+    json_text = extract_json_from_response(response.content)
+    return parse_summary(json_text)
+
+
+@semantic_cached(SUMMARY_CACHE_COLLECTION)
+def _summarize_text(text: str, backend: str, model: str, ticker: str = None) -> Dict[str, Any]:
+    """Summarize one (already truncated) text, {} on failure; the semantic cache is scoped to ticker"""
+    messages = _summary_messages(text)
+    model_server = _summary_model(backend, model)
+
+    try:
+        try:
+            result = _invoke_summary(model_server, messages)
+        except ValueError as e:
+            # Re-sending the same prompt gets the same reply, ask once more deterministically with a reminder
+            logger.warning(f"Invalid summary for {text[:15]}: {e}, retrying with a JSON reminder")
+            result = _invoke_summary(
+                _strict_summary_model(model_server, backend, model), messages + [SUMMARY_JSON_REMINDER_MESSAGE]
+            )
+    except ValueError as e:
+        logger.error(f"Invalid summary for {text[:15]}: {e}")
+        dump_failed_text(messages[1].content)
+        return {}
+    except Exception as e:
+        logger.error(f"Summarize failed for {text[:15]}: {e}")
+        return {}
+
+    logger.info("Analysis completed successfully")
+    return result
+
+
 def summarize(text: str, callback: Callable = None, 
-              backend: str = "ollama", metadata: Dict[str, Any] = None) -> Union[Dict[str, Any], None]:
+              backend: str = "ollama", metadata: Dict[str, Any] = None,
+              model: str = "glm4:9b-chat-q8_0", ticker: str = None) -> Union[Dict[str, Any], None]:
     """
     Summarize given text using the configured model server.
+    Near-duplicate texts about the same ticker summarized before are served from the semantic cache.
     
     Args:
         text: The text to summarize
         callback: Optional callback function for async processing
         backend: Backend to use ('mlx', 'azure', 'ollama')
         metadata: Additional metadata to include in result
+        model: Model name for the backend
+        ticker: Stock the text is about, the semantic cache is skipped without it
 
     Returns:
         Dictionary with summarized information or None if callback provided
     """
-    max_attempts = DEFAULT_MAX_RETRIES
     metadata = metadata or {}
 
-    formatted_prompt = SUMMARIZE_PROMPT_V3.format(text=text)
-
-    messages = [
-        SystemMessage(content=STOCK_SUMMARIZE_SYSTEM_PROMPT),
-        HumanMessage(content=formatted_prompt)
-    ]
-
-    # Get model server
-    model_server = get_chat(backend=backend, model="glm4:9b-chat-q8_0")
+    text = truncate_to_tokens(text, SUMMARY_MAX_INPUT_TOKENS)
 
     # Process asynchronously if callback provided
     if callback:
+        messages = _summary_messages(text)
+        model_server = _summary_model(backend, model)
         request_id = f"summarize_{hash(text)[:20]}_{time.time()}"
 
         def on_complete(req_id, result):
@@ -188,9 +238,7 @@ def summarize(text: str, callback: Callable = None,
 
                 # Extract the JSON response
                 json_text = extract_json_from_response(result["content"])
-                summarized_json = SummaryResponse.model_validate_json(json_text)
-                result = summarized_json.model_dump()
-                callback(result)
+                callback(parse_summary(json_text))
             except Exception as e:
                 logger.error(f"Error processing summary result: {e}")
                 callback({"error": str(e), "metadata": metadata})
@@ -204,15 +252,151 @@ def summarize(text: str, callback: Callable = None,
         )
         return None
 
-    def process_summary():
-        res = model_server.process_sync(messages, metadata=metadata)
-        if "error" in res:
-            raise Exception(f"Model server error: {res['error']}")
-        json_text = extract_json_from_response(res["content"])
-        SummaryResponse.model_validate_json(json_text)
-        return json_text
+    return _summarize_text(text, backend, model, ticker=ticker)
 
-    return _process_sync_with_retry(process_summary, formatted_prompt, metadata, max_attempts, "Analysis completed successfully")
+
+def summarize_many(texts: List[str], backend: str = "ollama", model: str = "glm4:9b-chat-q8_0",
+                   max_concurrency: int = DEFAULT_SUMMARY_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Summarize several texts with one batched call to the chat model, keeping
+    up to max_concurrency requests in flight instead of one at a time.
+
+    Args:
+        texts: The texts to summarize
+        backend: Backend to use ('mlx', 'azure', 'ollama', 'lmstudio')
+        model: Model name for the backend
+        max_concurrency: Maximum number of concurrent requests
+
+    Returns:
+        One summary dict per text, {} where summarizing failed
+    """
+    model_server = _summary_model(backend, model)
+    prompts = [format_summarize_prompt(truncate_to_tokens(text, SUMMARY_MAX_INPUT_TOKENS)) for text in texts]
+
+    def generate(batch: List[str]) -> list:
+        replies = model_server.batch(
+            [[SUMMARIZE_SYSTEM_MESSAGE, HumanMessage(content=prompt)] for prompt in batch],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        )
+        return [reply if isinstance(reply, Exception) else reply.content for reply in replies]
+
+    return batch_summaries(generate, prompts, DEFAULT_MAX_RETRIES, DEFAULT_BASE_DELAY)
+
+
+def _group_for_batch(texts: List[str], batch_size: int, max_prompt_tokens: int) -> List[List[int]]:
+    """Slice text indices into groups of at most batch_size that fit the prompt token budget"""
+    budget = max_prompt_tokens - estimate_tokens(SUMMARIZE_PROMPT_V5_BATCH)
+    groups = []
+    current = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= batch_size or current_tokens + tokens > budget):
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def summarize_batch(
+    texts: List[str],
+    batch_size: int = DEFAULT_SUMMARY_BATCH_SIZE,
+    backend: str = "ollama",
+    model: str = "glm4:9b-chat-q8_0",
+    max_prompt_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+) -> List[Dict[str, Any]]:
+    """
+    Summarize several texts by packing up to batch_size documents into each request,
+    so the system prompt and instructions are prefilled once per group instead of once per text.
+
+    Args:
+        texts: The texts to summarize
+        batch_size: Maximum number of documents per request
+        backend: Backend to use ('mlx', 'azure', 'ollama', 'lmstudio')
+        model: Model name for the backend
+        max_prompt_tokens: Estimated prompt token budget per request
+
+    Returns:
+        List of summary dictionaries aligned with texts, empty dict for failed entries
+    """
+    # Identical stories only go to the model once, earlier batches are served from disk
+    unique_texts, order = dedupe_texts(texts)
+    unique_texts = [truncate_to_tokens(text, SUMMARY_MAX_INPUT_TOKENS) for text in unique_texts]
+    cache_keys = [f"summary_batch_{content_key(text)}" for text in unique_texts]
+    results: List[Dict[str, Any]] = [{} for _ in unique_texts]
+    with cache_instance as cache:
+        for i, key in enumerate(cache_keys):
+            results[i] = cache.get(key, {})
+    pending = [i for i, result in enumerate(results) if not result]
+    if len(pending) < len(texts):
+        logger.info(f"Summarizing {len(pending)} of {len(texts)} texts after deduplication and cache hits")
+
+    llm = with_json_schema(get_chat(backend=backend, model=model), backend, SummaryBatch,
+                           max_tokens=SUMMARY_MAX_TOKENS * batch_size)
+    pending_texts = [unique_texts[i] for i in pending]
+
+    for group in _group_for_batch(pending_texts, batch_size, max_prompt_tokens):
+        group = [pending[i] for i in group]
+        documents = "\n\n".join(
+            BATCH_DOCUMENT_TEMPLATE.format(index=j, text=unique_texts[i]) for j, i in enumerate(group)
+        )
+        formatted_prompt = SUMMARIZE_PROMPT_V5_BATCH.format(
+            count=len(group), last_index=len(group) - 1, documents=documents
+        )
+        messages = [
+            SUMMARIZE_SYSTEM_MESSAGE,
+            HumanMessage(content=formatted_prompt)
+        ]
+        try:
+            response = llm.invoke(messages)
+            batch = SummaryBatch.model_validate_json(extract_json_from_response(response.content))
+        except Exception as e:
+            logger.error(f"Batch summarization of {len(group)} documents failed: {e}")
+            dump_failed_text(formatted_prompt)
+            continue
+
+        # A dropped or merged item would shift every later summary onto the wrong document
+        items = {item.index: item for item in batch.items}
+        if len(batch.items) != len(group) or sorted(items) != list(range(len(group))):
+            logger.warning(
+                f"Expected summaries for documents 0..{len(group) - 1}, model returned indices "
+                f"{[item.index for item in batch.items]}, summarizing them one by one"
+            )
+            for i in group:
+                results[i] = _summarize_text(unique_texts[i], backend, model)
+            continue
+
+        # Only replies that passed the index check are kept for a day
+        with cache_instance as cache:
+            for j, i in enumerate(group):
+                results[i] = items[j].model_dump(exclude={"index"})
+                cache.set(cache_keys[i], results[i], expire=DAY_TTL)
+
+    return [dict(results[k]) for k in order]
+
+
+def _consult_mlx(prompt, model: str, inputs: Dict[str, Any]) -> str:
+    """Generate a consult reply with mlx_lm, reusing the prefilled prompt prefix"""
+    from ml_serving.mlx_engine import generate_cached, split_on_document
+
+    user_prefix, user_suffix = split_on_document(
+        lambda document: prompt.template.format(loadedDocument=document, purchase_price=inputs["purchase_price"])
+    )
+    return generate_cached(
+        model or MLX_MODEL_PATH,
+        STOCK_CONSULT_SYSTEM_PROMPT,
+        user_prefix,
+        inputs["loadedDocument"],
+        user_suffix,
+        max_tokens=FIN_R1_ARGS["max_tokens"],
+        temp=FIN_R1_ARGS["temp"],
+        top_p=FIN_R1_ARGS["top_p"],
+    )
 
 
 def consult(
@@ -256,15 +440,19 @@ def consult(
 
     prompt = OWNERSHIP_PROMPT if purchase_price else CONSULT_PROMPT_V7
 
-    messages = ChatPromptTemplate.from_messages(
-        [
-            ("system", STOCK_CONSULT_SYSTEM_PROMPT),
-            ("user", prompt.template)
-        ]
-    )
-    # Get model server
-    llm = get_chat(backend=backend, model=model, **FIN_R1_ARGS)
-    chain = messages | llm | StrOutputParser() | JsonOutputParser() 
+    if backend == "mlx":
+        # Call mlx_lm directly so the system prompt and template prefix are prefilled once per process
+        chain = RunnableLambda(lambda inputs: _consult_mlx(prompt, model, inputs)) | JsonOutputParser()
+    else:
+        messages = ChatPromptTemplate.from_messages(
+            [
+                ("system", STOCK_CONSULT_SYSTEM_PROMPT),
+                ("user", prompt.template)
+            ]
+        )
+        # Get model server
+        llm = get_chat(backend=backend, model=model, **FIN_R1_ARGS)
+        chain = messages | llm | StrOutputParser() | JsonOutputParser()
     chain = chain.with_retry(
         stop_after_attempt=max_retries
     )
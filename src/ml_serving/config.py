@@ -2,10 +2,6 @@
 Configuration for AI services.
 """
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
 
 # MLX Configuration
 MLX_MODEL_PATH = os.environ.get("MLX_MODEL_PATH", "/Users/roy.belio/Repos/QSBets/ml_serving/mlx_model") # fino1 llama 8b is the one I downloaded and quantized
@@ -26,9 +22,21 @@ DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY", "")
 # Ollama Configuration
 OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "plutus3")
+# Keep the model and its KV cache resident between requests so the shared prompt prefix is reused
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+# Shared HTTP connection pool settings for the model clients
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+HTTP_MAX_CONNECTIONS = 64
+HTTP_TIMEOUT = 600
 
 # Default backend to use
 DEFAULT_BACKEND = os.environ.get("DEFAULT_AI_BACKEND", "mlx")
+
+# Completion token cap per SummaryResponse, the JSON replies fit in ~150 tokens
+SUMMARY_MAX_TOKENS = 220
+# Input token cap per summarized text, the tail of long scraped pages rarely matters
+SUMMARY_MAX_INPUT_TOKENS = 6000
 QWQ_KWARGS = {
     "max_tokens": 64000,
     "verbose": True,
@@ -0,0 +1,264 @@
+"""
+Direct mlx_lm generation with a reusable prompt-prefix KV cache.
+Bypasses the LangChain MLX wrappers so the static system prompt and template
+prefix are prefilled once per process instead of once per document.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import cache
+from typing import Any, Callable, List, Tuple
+
+from ml_serving.config import MLX_MODEL_PATH
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Number of distinct prefixes kept prefilled per model, the oldest one is dropped first
+MAX_PREFIX_CACHES = 4
+# Marker used to split a chat template around the variable document
+_DOCUMENT_MARKER = "\x00document\x00"
+
+_prefix_caches: "OrderedDict[Tuple[str, str], PrefixCache]" = OrderedDict()
+_prefix_caches_lock = threading.Lock()
+
+
+def _is_quantized(model_path: str) -> bool:
+    """Whether a local MLX model directory holds quantized weights, True when it can't be told"""
+    config_path = os.path.join(model_path, "config.json")
+    if not os.path.isfile(config_path):
+        return True
+    with open(config_path) as f:
+        return "quantization" in json.load(f)
+
+
+@cache
+def load_model(model_path: str = MLX_MODEL_PATH) -> Tuple[Any, Any]:
+    """Load the MLX model and tokenizer once per process"""
+    from mlx_lm import load
+
+    if not _is_quantized(model_path):
+        # Decoding is memory-bandwidth bound, 16-bit weights move 4x the bytes of q4 per token
+        logger.warning(f"MLX model at {model_path} isn't quantized, convert it with mlx_lm.convert -q --q-bits 4")
+    logger.info(f"Loading MLX model from {model_path}")
+    return load(model_path)
+
+
+def _encode(tokenizer, prompt: str) -> List[int]:
+    """Tokenize a templated prompt without adding a second BOS token"""
+    add_special_tokens = tokenizer.bos_token is None or not prompt.startswith(tokenizer.bos_token)
+    return tokenizer.encode(prompt, add_special_tokens=add_special_tokens)
+
+
+class PrefixCache:
+    """
+    KV cache holding a prefilled prompt prefix.
+    After each generation the cache is trimmed back to the prefix, so the next
+    document only pays prefill for its own tokens.
+    """
+
+    def __init__(self, model, tokenizer, prefix: str):
+        import mlx.core as mx
+        from mlx_lm.models.cache import make_prompt_cache
+
+        self.model = model
+        self.tokenizer = tokenizer
+        # Drop the last token, it may merge with the first document characters
+        self.tokens = _encode(tokenizer, prefix)[:-1]
+        self.cache = make_prompt_cache(model)
+        self.lock = threading.Lock()
+
+        self.model(mx.array(self.tokens)[None], cache=self.cache)
+        mx.eval([c.state for c in self.cache])
+        logger.info(f"Prefilled {len(self.tokens)} prefix tokens")
+
+    def rewind(self) -> bool:
+        """Trim the cache back to the prefix, returns False if the cache can't be trimmed"""
+        from mlx_lm.models.cache import can_trim_prompt_cache, trim_prompt_cache
+
+        if not can_trim_prompt_cache(self.cache):
+            return False
+        trim_prompt_cache(self.cache, self.cache[0].offset - len(self.tokens))
+        return True
+
+
+def _get_prefix_cache(model_path: str, prefix: str) -> PrefixCache:
+    """Return the prefilled cache for a prefix, building it on first use"""
+    key = (model_path, prefix)
+    with _prefix_caches_lock:
+        prefix_cache = _prefix_caches.get(key)
+        if prefix_cache is not None:
+            _prefix_caches.move_to_end(key)
+            return prefix_cache
+
+        model, tokenizer = load_model(model_path)
+        prefix_cache = PrefixCache(model, tokenizer, prefix)
+        _prefix_caches[key] = prefix_cache
+        if len(_prefix_caches) > MAX_PREFIX_CACHES:
+            _prefix_caches.popitem(last=False)
+        return prefix_cache
+
+
+def _drop_prefix_cache(model_path: str, prefix: str) -> None:
+    with _prefix_caches_lock:
+        _prefix_caches.pop((model_path, prefix), None)
+
+
+def split_on_document(render: Callable[[str], str]) -> Tuple[str, str]:
+    """
+    Render a prompt with a marker in place of the document and split it around the marker.
+
+    Args:
+        render: Builds the full prompt from the document text
+
+    Returns:
+        The prompt text before and after the document
+    """
+    prefix, suffix = render(_DOCUMENT_MARKER).split(_DOCUMENT_MARKER)
+    return prefix, suffix
+
+
+def _json_object_end(text: str, state: List[int]) -> int:
+    """
+    Scan streamed text for the end of the first top-level JSON object.
+    state is [depth, in_string, escaped, seen_open] and carries over between segments.
+
+    Returns:
+        The index in text just past the closing brace, or -1 if the object isn't closed yet
+    """
+    depth, in_string, escaped, seen_open = state
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = 0
+            elif char == "\\":
+                escaped = 1
+            elif char == '"':
+                in_string = 0
+        elif char == '"':
+            in_string = 1
+        elif char == "{":
+            depth += 1
+            seen_open = 1
+        elif char == "}" and seen_open:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    state[:] = [depth, in_string, escaped, seen_open]
+    return -1
+
+
+def _generate(model, tokenizer, prompt: List[int], stop_on_json: bool, **kwargs) -> str:
+    """Run mlx_lm generation, optionally stopping as soon as the first JSON object is complete"""
+    from mlx_lm import generate, stream_generate
+
+    if not stop_on_json:
+        return generate(model, tokenizer, prompt=prompt, **kwargs)
+
+    parts = []
+    state = [0, 0, 0, 0]
+    for response in stream_generate(model, tokenizer, prompt=prompt, **kwargs):
+        end = _json_object_end(response.text, state)
+        if end >= 0:
+            parts.append(response.text[:end])
+            break
+        parts.append(response.text)
+    return "".join(parts)
+
+
+def generate_cached(
+    model_path: str,
+    system_prompt: str,
+    user_prefix: str,
+    document: str,
+    user_suffix: str = "",
+    max_tokens: int = 2048,
+    temp: float = 0.0,
+    top_p: float = 1.0,
+    stop_on_json: bool = False,
+) -> str:
+    """
+    Generate a reply for system + user messages where only the document varies between calls.
+
+    Args:
+        model_path: Path or repo id of the MLX model
+        system_prompt: The system message
+        user_prefix: Static user message text before the document
+        document: The variable document text
+        user_suffix: Static user message text after the document
+        max_tokens: Maximum number of generated tokens
+        temp: Sampling temperature
+        top_p: Nucleus sampling threshold
+        stop_on_json: Stop decoding once the first top-level JSON object closes
+
+    Returns:
+        The generated text
+    """
+    from mlx_lm.sample_utils import make_sampler
+
+    model, tokenizer = load_model(model_path)
+
+    def render(content: str) -> str:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prefix + content + user_suffix},
+        ]
+        return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    prefix, _ = split_on_document(render)
+    tokens = _encode(tokenizer, render(document))
+    prefix_cache = _get_prefix_cache(model_path, prefix)
+    sampler = make_sampler(temp=temp, top_p=top_p)
+
+    with prefix_cache.lock:
+        cached = prefix_cache.tokens
+        if tokens[:len(cached)] != cached:
+            logger.warning("Prompt doesn't start with the cached prefix, generating without cache")
+            return _generate(model, tokenizer, tokens, stop_on_json, max_tokens=max_tokens, sampler=sampler)
+
+        try:
+            return _generate(
+                model,
+                tokenizer,
+                tokens[len(cached):],
+                stop_on_json,
+                max_tokens=max_tokens,
+                sampler=sampler,
+                prompt_cache=prefix_cache.cache,
+            )
+        finally:
+            # Also after a failed generation, else the next call decodes on this document's tokens
+            if not prefix_cache.rewind():
+                _drop_prefix_cache(model_path, prefix)
+
+
+def generate_batch(model_path: str, system_prompt: str, user_prompts: List[str], max_tokens: int = 512) -> List[str]:
+    """
+    Generate replies for several user prompts in one batched decode, so the
+    weights are read once per step for the whole batch instead of once per prompt.
+
+    Args:
+        model_path: Path or repo id of the MLX model
+        system_prompt: The system message shared by every prompt
+        user_prompts: One user message per reply
+        max_tokens: Maximum number of generated tokens per reply
+
+    Returns:
+        The generated texts, in the order of user_prompts
+    """
+    from mlx_lm import batch_generate
+
+    model, tokenizer = load_model(model_path)
+    prompts = [
+        _encode(
+            tokenizer,
+            tokenizer.apply_chat_template(
+                [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+                tokenize=False,
+                add_generation_prompt=True,
+            ),
+        )
+        for user_prompt in user_prompts
+    ]
+    return batch_generate(model, tokenizer, prompts, max_tokens=max_tokens).texts
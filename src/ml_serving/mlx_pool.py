@@ -0,0 +1,88 @@
+"""
+Process pool for running consult() over many files with the MLX backend.
+Each worker process loads its own copy of the model once and keeps its
+prompt cache warm across the files it handles.
+"""
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List
+
+from ml_serving.config import MLX_MODEL_PATH
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+_model_path = MLX_MODEL_PATH
+
+
+def _model_size_bytes(model_path: str) -> int:
+    """Size of the model weights on disk, 0 if unknown"""
+    return sum(os.path.getsize(f) for f in glob.glob(os.path.join(model_path, "*.safetensors")))
+
+
+def _max_workers_for_memory(model_path: str, workers: int) -> int:
+    """Cap the number of workers so every model copy fits in available memory"""
+    try:
+        import psutil
+    except ImportError:
+        return workers
+
+    model_size = _model_size_bytes(model_path)
+    if not model_size:
+        return workers
+    fit = max(1, psutil.virtual_memory().available // model_size)
+    if fit < workers:
+        logger.warning(f"Only {fit} MLX workers fit in available memory, requested {workers}")
+    return min(workers, fit)
+
+
+def _init_mlx(model_path: str):
+    """Worker initializer: load the model before the first file arrives"""
+    global _model_path
+    from ml_serving.mlx_engine import load_model
+
+    _model_path = model_path
+    load_model(model_path)
+
+
+def _consult_one(path: str) -> Dict[str, Any]:
+    """Consult one file, returning {"error": ...} so a failing file doesn't discard the others"""
+    from ml_serving.ai_service import consult
+
+    try:
+        return consult(path, backend="mlx", model=_model_path)
+    except Exception as e:
+        logger.error(f"Consulting {path} failed: {e}")
+        return {"error": str(e), "path": path}
+
+
+def analyze_files(paths: List[str], workers: int = 2, model_path: str = MLX_MODEL_PATH) -> List[Dict[str, Any]]:
+    """
+    Run consult() over several stock files in parallel MLX worker processes.
+
+    Args:
+        paths: Paths to the JSON/YAML files containing stock data
+        workers: Number of worker processes, each holds one model copy
+        model_path: Path to the MLX model
+
+    Returns:
+        Parsed consult results in the same order as paths, {"error": ...} for failed files
+    """
+    if not paths:
+        return []
+
+    workers = min(_max_workers_for_memory(model_path, workers), len(paths))
+    if workers <= 1:
+        _init_mlx(model_path)
+        return [_consult_one(path) for path in paths]
+
+    # Metal state isn't fork-safe, start workers with spawn
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_mlx,
+        initargs=(model_path,),
+    ) as executor:
+        return list(executor.map(_consult_one, paths))
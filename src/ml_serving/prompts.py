@@ -1,6 +1,5 @@
 from langchain.prompts import PromptTemplate
 
-SUMMARIZE_PROMPT_V1 = "Summarize the following text in concise and technical bullet points for company symbol {symbol} only, keep relevant figures, numbers and relevant names to be used by further analysis, if no relevant information is provided, return article title and the string, 'no relevant data':\n\n{text}"
 SUMMARIZE_PROMPT_V2 = (
     "Summarize in 100 words maximum."
     "Return valid JSON object in the following format:"
@@ -9,6 +8,8 @@ SUMMARIZE_PROMPT_V2 = (
 )
 STOCK_SUMMARIZE_SYSTEM_PROMPT = "You are a financial summarization assistant specialized in extracting quantitative insights. Focus on key metrics, valuations (P/E, P/S ratios), growth rates, market positioning, and business risks. Ignore unrelated content and format your response as structured data."
 STOCK_CONSULT_SYSTEM_PROMPT = "You are an expert stock analyst. Always provide your analysis in the requested JSON format."
+# Follow-up turn when a summary reply failed schema validation
+SUMMARY_JSON_REMINDER = "Your previous response was not valid JSON matching the schema. Return ONLY the JSON object."
 
 SUMMARIZE_PROMPT_V3 = (
     "Extract and summarize key financial metrics from the content below."
@@ -31,6 +32,29 @@ SUMMARIZE_PROMPT_V3 = (
     "Text to analyze:\n{text}"
 )
 
+SUMMARIZE_PROMPT_V5_BATCH = (
+    "Extract and summarize key financial metrics from each of the {count} documents below."
+    '\n\nRETURN A VALID JSON OBJECT with an "items" array of exactly {count} objects, '
+    "one per document, in document order (index 0..{last_index}). Each object uses this EXACT format:"
+    "\n{{\n"
+    '  "index": index of the document in square brackets,\n'
+    '  "date": "publication date in YYYY-MM-DD format",\n'
+    '  "source": "name of the publishing organization",\n'
+    '  "summary": {{\n'
+    '    "[ACTUAL_TICKER_SYMBOL]": "1-2 sentence summary with key metrics and valuation"\n'
+    "  }},\n"
+    '  "relevant_symbol": "actual ticker symbol of the company"\n'
+    "}}\n\n"
+    "IMPORTANT INSTRUCTIONS:\n"
+    "1. Replace [ACTUAL_TICKER_SYMBOL] with the real stock ticker symbol (e.g., AAPL, MSFT, GOOGL)\n"
+    "2. Summarize every document independently, never merge information across documents\n"
+    "3. Focus on quantitative data: revenue growth percentages, earnings, EPS, P/E ratios, margins\n"
+    "4. Include year-over-year comparisons when available\n"
+    "5. Do not use placeholder text like 'TICKER1' in your response\n\n"
+    "Documents to analyze:\n{documents}"
+)
+BATCH_DOCUMENT_TEMPLATE = "[{index}] {text}"
+
 SUMMARIZE_PROMPT_V4 = (
     "Extract basic financial information from the text below."
     "\n\nProvide your response in this JSON format:"
@@ -52,6 +76,35 @@ SUMMARIZE_PROMPT_V4 = (
     "Text to analyze:\n{text}"
 )
 
+
+def _split_template(template: str, field: str) -> tuple[str, str]:
+    """Split a single-field str.format template into its literal prefix and suffix"""
+    prefix, suffix = template.split("{" + field + "}")
+    return (
+        prefix.replace("{{", "{").replace("}}", "}"),
+        suffix.replace("{{", "{").replace("}}", "}"),
+    )
+
+
+# Precomputed halves of the summarize prompts, so formatting is a plain concatenation
+_SUMMARIZE_PROMPT_PARTS = {
+    2: _split_template(SUMMARIZE_PROMPT_V2, "text"),
+    3: _split_template(SUMMARIZE_PROMPT_V3, "text"),
+    4: _split_template(SUMMARIZE_PROMPT_V4, "text"),
+}
+
+
+def summarize_prompt_parts(version: int = 3) -> tuple[str, str]:
+    """The literal text before and after {text} in SUMMARIZE_PROMPT_V{version}"""
+    return _SUMMARIZE_PROMPT_PARTS[version]
+
+
+def format_summarize_prompt(text: str, version: int = 3) -> str:
+    """Equivalent to SUMMARIZE_PROMPT_V{version}.format(text=text) without re-parsing the template"""
+    prefix, suffix = _SUMMARIZE_PROMPT_PARTS[version]
+    return prefix + text + suffix
+
+
 CONSULT_PROMPT_V3 = PromptTemplate(
     input_variables=["loadedDocument"],
     template="""Rate stock, use the stock provided data and your general knowledge about industry and market.
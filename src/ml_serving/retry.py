@@ -0,0 +1,82 @@
+"""
+Retry policy shared by the summarize providers.
+Only transient failures (timeouts, dropped connections, 429 and 5xx responses) are
+retried with backoff; a reply that fails JSON/schema validation is raised right away
+since the same prompt would produce the same wrong answer.
+"""
+import functools
+import random
+import time
+from typing import Callable, TypeVar
+
+import httpx
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+# Bad model output: json.JSONDecodeError and pydantic.ValidationError are both ValueErrors
+UNRECOVERABLE_ERRORS = (ValueError,)
+
+
+def _status_code(e: Exception):
+    """HTTP status of an error from httpx, openai or ollama clients, None if not an HTTP error"""
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    return status
+
+
+def is_transient(e: Exception) -> bool:
+    """Whether retrying the same request can succeed"""
+    if isinstance(e, (httpx.TimeoutException, httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    return _status_code(e) in RETRYABLE_STATUS_CODES
+
+
+def should_retry(e: Exception, attempt: int, max_attempts: int) -> bool:
+    """Whether a call that failed with e on the given attempt gets another try"""
+    if isinstance(e, UNRECOVERABLE_ERRORS):
+        return False
+    limit = max_attempts if is_transient(e) else min(2, max_attempts)
+    return attempt < limit
+
+
+def backoff_delay(attempt: int, base_delay: float) -> float:
+    """
+    Delay before retrying after the given failed attempt.
+    Half of the exponential delay is randomized so callers that failed together on an
+    overloaded backend don't all come back at the same moment.
+    """
+    delay = base_delay * 2 ** (attempt - 1)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry_transient(max_attempts: int = 3, base_delay: float = 2.0) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """
+    Decorator retrying transient failures with jittered exponential backoff.
+    Unrecoverable errors are raised immediately, any other error is retried once.
+
+    Args:
+        max_attempts: Maximum number of attempts for transient failures
+        base_delay: Upper bound of the first retry delay, doubled on every further retry
+    """
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs) -> T:
+            attempt = 1
+            while True:
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    if not should_retry(e, attempt, max_attempts):
+                        raise
+                    delay = backoff_delay(attempt, base_delay)
+                    logger.warning(f"Attempt {attempt} of {fn.__name__} failed: {e}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    attempt += 1
+        return wrapper
+    return decorator
@@ -0,0 +1,133 @@
+"""
+Provider routing for summarization.
+Tries backends in order of observed latency and falls through to the next one
+on errors or timeouts, so a single provider outage doesn't fail the caller.
+"""
+import asyncio
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, List, Sequence
+
+from ml_serving.ai_service import summarize
+from ml_serving.config import MLX_MODEL_PATH
+from logger import get_logger
+
+logger = get_logger("qsbets")
+
+DEFAULT_PROVIDERS = ("azure", "ollama", "mlx")
+DEFAULT_PROVIDER_TIMEOUT = 60.0
+EWMA_ALPHA = 0.3
+
+# Model used by each provider when summarizing
+PROVIDER_MODELS = {
+    "azure": None,
+    "ollama": "glm4:9b-chat-q8_0",
+    "mlx": MLX_MODEL_PATH,
+}
+
+# Exponentially weighted moving average of call latency per provider, in seconds
+_latency_ewma: Dict[str, float] = {}
+
+
+def _record_latency(provider: str, elapsed: float) -> None:
+    """Fold a latency sample into the provider's moving average"""
+    previous = _latency_ewma.get(provider)
+    if previous is None:
+        _latency_ewma[provider] = elapsed
+    else:
+        _latency_ewma[provider] = EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * previous
+
+
+def _run_in_thread(call: Callable[[], Any]) -> asyncio.Future:
+    """
+    Run a blocking call on its own daemon thread.
+    A timed-out call can't be cancelled, with a shared bounded pool a few hung providers
+    would take every worker and starve all later calls, here they only leak their own thread.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(result=None, error=None):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run():
+        try:
+            outcome = partial(settle, call())
+        except Exception as e:
+            outcome = partial(settle, error=e)
+        try:
+            loop.call_soon_threadsafe(outcome)
+        except RuntimeError:
+            # The loop closed while a timed-out call was still running, nobody awaits it anymore
+            pass
+
+    threading.Thread(target=run, name="summarize_router", daemon=True).start()
+    return future
+
+
+def rank_providers(providers: Sequence[str]) -> List[str]:
+    """
+    Order providers by ascending latency average.
+    Providers without samples keep their configured order after the measured ones.
+    """
+    return sorted(providers, key=lambda p: _latency_ewma.get(p, float("inf")))
+
+
+async def asummarize_with_fallback(
+    text: str,
+    providers: Sequence[str] = DEFAULT_PROVIDERS,
+    timeout: float = DEFAULT_PROVIDER_TIMEOUT,
+    ticker: str = None,
+) -> Dict[str, Any]:
+    """
+    Summarize text with the fastest healthy provider, falling back on failure.
+
+    Args:
+        text: The text to summarize
+        providers: Backends to try ('azure', 'ollama', 'mlx')
+        timeout: Per-provider deadline in seconds
+        ticker: Stock the text is about, scopes the semantic summary cache
+
+    Returns:
+        The first successful summary, or an empty dict if every provider failed
+    """
+    for provider in rank_providers(providers):
+        call = partial(summarize, text, backend=provider, model=PROVIDER_MODELS.get(provider), ticker=ticker)
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(_run_in_thread(call), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Provider {provider} timed out after {timeout:.0f}s, falling back")
+            _record_latency(provider, timeout)
+            continue
+        except Exception as e:
+            logger.warning(f"Provider {provider} failed: {e}, falling back")
+            _record_latency(provider, timeout)
+            continue
+
+        if not result:
+            logger.warning(f"Provider {provider} returned an empty summary, falling back")
+            _record_latency(provider, timeout)
+            continue
+
+        _record_latency(provider, time.monotonic() - start)
+        return result
+
+    logger.error(f"All providers failed to summarize text: {text[:30]}")
+    return {}
+
+
+def summarize_with_fallback(
+    text: str,
+    providers: Sequence[str] = DEFAULT_PROVIDERS,
+    timeout: float = DEFAULT_PROVIDER_TIMEOUT,
+    ticker: str = None,
+) -> Dict[str, Any]:
+    """Synchronous wrapper around asummarize_with_fallback"""
+    return asyncio.run(asummarize_with_fallback(text, providers, timeout, ticker))
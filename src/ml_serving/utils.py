@@ -1,11 +1,31 @@
-from datetime import datetime
+import atexit
+from functools import cache
+import hashlib
 import json
 import os
-from pydantic import BaseModel
+import threading
+import time
+from queue import Queue
+from typing import Callable
+from pydantic import BaseModel, TypeAdapter
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.output_parsers.base import BaseOutputParser
+from logger import get_logger
+
+logger = get_logger(__name__)
 _chat_instances = {}
 
+DEBUG_DUMPS_DIR = ".debug_dumps"
+os.makedirs(DEBUG_DUMPS_DIR, exist_ok=True)
+
+# Failed-text dumps are written by a background thread so retries don't wait on disk I/O
+_dump_queue: Queue = Queue()
+_dump_worker_lock = threading.Lock()
+_dump_worker = None
+
+# Lenient about raw control characters inside strings, as local models emit them
+_JSON_DECODER = json.JSONDecoder(strict=False)
+
 
 class SummaryResponse(BaseModel):
     date: str
@@ -14,21 +34,375 @@ class SummaryResponse(BaseModel):
     relevant_symbol: str
 
 
+class SummaryBatchItem(SummaryResponse):
+    # Position of the document in the batch prompt, replies are matched on it rather than on order
+    index: int
+
+
+class SummaryBatch(BaseModel):
+    items: list[SummaryBatchItem]
+
+
+# Built once per process instead of going through the model class on every reply
+_SUMMARY_ADAPTER = TypeAdapter(SummaryResponse)
+
+
+def parse_summary(json_text: str) -> dict:
+    """
+    Validate a SummaryResponse JSON reply and return it as a plain dict.
+
+    Args:
+        json_text: The JSON text extracted from the model reply
+
+    Returns:
+        The validated summary dict
+
+    Raises:
+        ValueError: If the reply doesn't match the SummaryResponse schema
+    """
+    return _SUMMARY_ADAPTER.dump_python(_SUMMARY_ADAPTER.validate_json(json_text))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for prompt budgeting (~4 characters per token).
+
+    Args:
+        text: The text to measure
+    """
+    return len(text) // 4 + 1
+
+
+@cache
+def _token_encoding(model: str):
+    """The tiktoken encoding for a model, None if it can't be loaded"""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # The BPE file is downloaded on first use, local backends must keep working offline
+        logger.warning(f"Tokenizer for {model} unavailable ({e}), truncating by characters")
+        return None
+
+
+def truncate_to_tokens(text: str, max_tokens: int = 6000, model: str = "gpt-4o-mini") -> str:
+    """
+    Cut the text to at most max_tokens tokens,
+    bounding prefill time and cost for very long pages.
+
+    Args:
+        text: The text to truncate
+        max_tokens: Maximum number of tokens to keep
+        model: Model whose tokenizer is used for counting
+
+    Returns:
+        The possibly truncated text
+    """
+    encoding = _token_encoding(model)
+    if encoding is None:
+        # Same ~4 characters per token ratio as estimate_tokens
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+@cache
+def get_text_splitter(chunk_size: int, chunk_overlap: int = 100):
+    """
+    Shared RecursiveCharacterTextSplitter per (chunk_size, chunk_overlap),
+    so map-reduce callers don't rebuild it and its separator regexes on every call.
+
+    Args:
+        chunk_size: Maximum characters per chunk
+        chunk_overlap: Characters shared between consecutive chunks
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", " ", ""],
+        keep_separator=False,
+    )
+
+
+@cache
+def _fast_chunker(chunk_size: int):
+    """chonkie's SIMD chunker when the 'fast' extra is installed, else None"""
+    try:
+        from chonkie import FastChunker
+    except ImportError:
+        return None
+    # chunk_size is in bytes here, close to characters for the English filings and news we split
+    return FastChunker(chunk_size=chunk_size, delimiters="\n.")
+
+
+def split_texts(texts: list[str], chunk_size: int, chunk_overlap: int = 100) -> list[str]:
+    """
+    Split texts into chunks of at most ~chunk_size characters.
+    Uses chonkie's FastChunker when available, which scans for boundaries with SIMD
+    instead of walking separator lists in Python, and falls back to get_text_splitter.
+
+    Args:
+        texts: The texts to split
+        chunk_size: Maximum characters per chunk
+        chunk_overlap: Characters shared between consecutive chunks, fallback splitter only
+
+    Returns:
+        The chunks of all texts, in order
+    """
+    chunker = _fast_chunker(chunk_size)
+    if chunker is None:
+        splitter = get_text_splitter(chunk_size, chunk_overlap)
+        return [chunk for text in texts for chunk in splitter.split_text(text)]
+
+    chunks = []
+    for text in texts:
+        pieces = [chunk.text for chunk in chunker.chunk(text)]
+        # Fold a small tail into the previous chunk rather than paying a model call for a sentence
+        if len(pieces) > 1 and len(pieces[-1]) < chunk_size // 4:
+            pieces[-2] += pieces.pop()
+        chunks.extend(pieces)
+    return chunks
+
+
+def tree_reduce(reduce_chain, summaries: list[str], inputs: dict = None, group_size: int = 4,
+                max_concurrency: int = 4, on_token: Callable[[str], None] = None) -> str:
+    """
+    Reduce summaries in groups of group_size, then reduce the group results,
+    until one summary is left. Every reduce prompt stays bounded in length and
+    the groups of one level run concurrently.
+
+    Args:
+        reduce_chain: Runnable taking {"summaries": ..., **inputs} and returning a string
+        summaries: The mapped chunk summaries
+        inputs: Extra prompt variables passed to every reduce call
+        group_size: Number of summaries combined per reduce call
+        max_concurrency: Maximum number of concurrent reduce calls per level
+        on_token: Optional callback receiving the final reduce output as it is streamed
+
+    Returns:
+        The final summary
+    """
+    inputs = inputs or {}
+    while True:
+        groups = [summaries[i:i + group_size] for i in range(0, max(len(summaries), 1), group_size)]
+        if len(groups) == 1 and on_token:
+            # Last level, hand tokens to the caller as they are generated
+            parts = []
+            for token in reduce_chain.stream({**inputs, "summaries": "\n\n".join(groups[0])}):
+                on_token(token)
+                parts.append(token)
+            return "".join(parts)
+        summaries = reduce_chain.batch(
+            [{**inputs, "summaries": "\n\n".join(group)} for group in groups],
+            config={"max_concurrency": max_concurrency},
+        )
+        if len(summaries) == 1:
+            return summaries[0]
+
+
+async def atree_reduce(reduce_chain, summaries: list[str], inputs: dict = None, group_size: int = 4,
+                       max_concurrency: int = 4, on_token: Callable[[str], None] = None) -> str:
+    """
+    Async tree_reduce: the groups of one level are awaited together with abatch,
+    so the reduce calls overlap without holding a thread each.
+
+    Args:
+        reduce_chain: Runnable taking {"summaries": ..., **inputs} and returning a string
+        summaries: The mapped chunk summaries
+        inputs: Extra prompt variables passed to every reduce call
+        group_size: Number of summaries combined per reduce call
+        max_concurrency: Maximum number of concurrent reduce calls per level
+        on_token: Optional callback receiving the final reduce output as it is streamed
+
+    Returns:
+        The final summary
+    """
+    inputs = inputs or {}
+    while True:
+        groups = [summaries[i:i + group_size] for i in range(0, max(len(summaries), 1), group_size)]
+        if len(groups) == 1 and on_token:
+            parts = []
+            async for token in reduce_chain.astream({**inputs, "summaries": "\n\n".join(groups[0])}):
+                on_token(token)
+                parts.append(token)
+            return "".join(parts)
+        summaries = await reduce_chain.abatch(
+            [{**inputs, "summaries": "\n\n".join(group)} for group in groups],
+            config={"max_concurrency": max_concurrency},
+        )
+        if len(summaries) == 1:
+            return summaries[0]
+
+
+def content_key(text: str) -> str:
+    """
+    Hash of the whitespace-normalized, lowercased text, so republished copies
+    of the same story map to the same key.
+
+    Args:
+        text: The text to hash
+    """
+    normalized = " ".join(text.split()).lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def dedupe_texts(texts: list[str]) -> tuple[list[str], list[int]]:
+    """
+    Collapse duplicate texts while remembering where each original came from.
+
+    Args:
+        texts: The texts to deduplicate
+
+    Returns:
+        The unique texts in first-seen order, and for every original text the
+        position of its unique copy
+    """
+    positions: dict[str, int] = {}
+    unique: list[str] = []
+    order: list[int] = []
+    for text in texts:
+        key = content_key(text)
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append(text)
+        order.append(positions[key])
+    return unique, order
+
+
+def with_json_schema(
+    llm: BaseChatModel, backend: str, schema: type[BaseModel], max_tokens: int = None
+) -> BaseChatModel:
+    """
+    Bind structured JSON decoding for the given schema where the backend supports it,
+    optionally capping the number of generated tokens.
+
+    Args:
+        llm: The chat model returned by get_chat
+        backend: The backend the model was created for
+        schema: Pydantic model describing the expected response
+        max_tokens: Optional completion token cap
+
+    Returns:
+        The chat model with the schema bound, or the original model
+    """
+    json_schema = schema.model_json_schema()
+    if backend == "ollama":
+        # Ollama takes the token cap through options, which would replace num_ctx; the schema bounds output
+        return llm.bind(format=json_schema)
+
+    limits = {"max_tokens": max_tokens} if max_tokens else {}
+    # Not strict: the summary object has free-form ticker keys
+    if backend == "lmstudio":
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {"name": schema.__name__, "schema": json_schema, "strict": False},
+        }
+        return llm.bind(response_format=response_format, **limits)
+    if backend == "azure":
+        from azure.ai.inference.models import JsonSchemaFormat
+
+        response_format = JsonSchemaFormat(name=schema.__name__, schema=json_schema, strict=False)
+        return llm.bind(response_format=response_format, **limits)
+    return llm
+
+
+def batch_summaries(
+    generate: Callable[[list[str]], list], prompts: list[str], max_attempts: int = 2, base_delay: float = 2.0
+) -> list[dict]:
+    """
+    Summarize several prompts with one batched generate call per round,
+    re-batching only the prompts whose failure is worth retrying.
+
+    Args:
+        generate: Maps a list of prompts to one reply text (or exception) per prompt
+        prompts: The formatted summarize prompts
+        max_attempts: Maximum number of rounds for transient failures
+        base_delay: Delay before the first retry round, doubled on every further round
+
+    Returns:
+        One SummaryResponse dict per prompt, {} where summarizing failed
+    """
+    from ml_serving.retry import backoff_delay, should_retry
+
+    results = [{} for _ in prompts]
+    pending = list(range(len(prompts)))
+    attempt = 1
+    while pending:
+        try:
+            replies = generate([prompts[i] for i in pending])
+        except Exception as e:
+            replies = [e] * len(pending)
+
+        retry = []
+        for i, reply in zip(pending, replies):
+            try:
+                if isinstance(reply, Exception):
+                    raise reply
+                results[i] = parse_summary(extract_json_from_response(reply))
+            except Exception as e:
+                if should_retry(e, attempt, max_attempts):
+                    retry.append(i)
+                    continue
+                logger.error(f"Summarize failed for prompt {i}: {e}")
+                if isinstance(e, ValueError):
+                    dump_failed_text(prompts[i])
+
+        if retry:
+            delay = backoff_delay(attempt, base_delay)
+            logger.warning(f"Retrying {len(retry)} of {len(pending)} prompts in {delay:.1f}s")
+            time.sleep(delay)
+        pending = retry
+        attempt += 1
+    return results
+
+
+def _drain_dumps():
+    """Write queued (filename, text) dumps to disk"""
+    while True:
+        filename, text = _dump_queue.get()
+        try:
+            # O_EXCL never overwrites an existing dump
+            fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            with os.fdopen(fd, "w") as file:
+                file.write(text)
+        except OSError as e:
+            logger.error(f"Failed to write debug dump {filename}: {e}")
+        finally:
+            _dump_queue.task_done()
+
+
+def _ensure_dump_worker():
+    """Start the dump writer thread on first use"""
+    global _dump_worker
+    with _dump_worker_lock:
+        if _dump_worker is None:
+            _dump_worker = threading.Thread(target=_drain_dumps, name="dump_failed_text", daemon=True)
+            _dump_worker.start()
+            # Flush pending dumps before the interpreter exits
+            atexit.register(_dump_queue.join)
+
+
 def dump_failed_text(text: str):
     """
     Dump the failed text to a file in the debug_dumps folder.
+    The write happens on a background thread, so this returns immediately.
 
     Args:
         text: The text to dump
     """
-    if not os.path.exists(".debug_dumps"):
-        os.makedirs(".debug_dumps")
+    # Nanosecond names sort chronologically and don't collide within a burst of failures
+    filename = f"{DEBUG_DUMPS_DIR}/{time.time_ns()}.txt"
 
-    date_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f".debug_dumps/{date_str}.txt"
-
-    with open(filename, "w") as file:
-        file.write(text)
+    _ensure_dump_worker()
+    _dump_queue.put((filename, text))
 
 
 def get_chat(backend: str = "lmstudio", model: str = None, **kwargs) -> BaseChatModel:
@@ -88,11 +462,25 @@ def get_chat(backend: str = "lmstudio", model: str = None, **kwargs) -> BaseChat
         )
         instance = ChatMLX(llm=llm, **kwargs)
     elif backend == "ollama":
+        import httpx
         from langchain_ollama import ChatOllama
+        from ml_serving.config import HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_TIMEOUT, OLLAMA_KEEP_ALIVE
 
+        # Keep a pooled HTTP/2-capable connection per client instead of reconnecting per request
+        kwargs.setdefault("client_kwargs", {
+            "http2": True,
+            "limits": httpx.Limits(
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                max_connections=HTTP_MAX_CONNECTIONS,
+            ),
+            "timeout": HTTP_TIMEOUT,
+        })
+        kwargs.setdefault("keep_alive", OLLAMA_KEEP_ALIVE)
         instance = ChatOllama(model=model, num_ctx=16384, **kwargs)
     elif backend == "lmstudio":
+        import httpx
         from langchain_openai import ChatOpenAI
+        from ml_serving.config import HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_TIMEOUT
         kwargs.pop("system_message", None)
         kwargs.pop("temp", None)
         kwargs.pop("num_predict", None)
@@ -102,6 +490,16 @@ def get_chat(backend: str = "lmstudio", model: str = None, **kwargs) -> BaseChat
         kwargs.pop("repeat_last_n", None)
         kwargs.pop("keep_alive", None)
         kwargs.pop("format", None)
+        # Ask the llama.cpp engine to keep the evaluated prompt so a shared prefix isn't prefilled again
+        kwargs.setdefault("extra_body", {"cache_prompt": True})
+        # One keep-alive pool per client, so the concurrent map calls reuse their connections
+        limits = httpx.Limits(
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            max_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=60,
+        )
+        kwargs.setdefault("http_client", httpx.Client(limits=limits, timeout=HTTP_TIMEOUT))
+        kwargs.setdefault("http_async_client", httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT))
         instance = ChatOpenAI(
             base_url="http://localhost:1234/v1", model=model, api_key="not-needed", **kwargs
         )
@@ -121,11 +519,24 @@ def extract_json_from_response(response: str) -> str:
     Returns:
         Extracted JSON string
     """
+    stripped = response.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        # Bare object, as returned by schema-constrained backends: the caller's validator
+        # parses it anyway, so skip decoding it a second time just to locate it
+        return stripped.replace("\n", "")
+
     start_idx = response.find("{")
-    end_idx = response.rfind("}")
-    if start_idx == -1 or end_idx == -1:
+    if start_idx == -1:
         raise ValueError("No valid JSON found in the response.")
-    json_str = response[start_idx : end_idx + 1].replace("\n", "")
+    try:
+        # Single C-level pass that stops at the brace closing the first object,
+        # so trailing prose containing braces isn't swallowed
+        _, end_idx = _JSON_DECODER.raw_decode(response, start_idx)
+    except json.JSONDecodeError:
+        end_idx = response.rfind("}") + 1
+        if end_idx == 0:
+            raise ValueError("No valid JSON found in the response.")
+    json_str = response[start_idx:end_idx].replace("\n", "")
 
     return json_str
 
@@ -133,7 +544,7 @@ def extract_json_from_response(response: str) -> str:
 class JsonOutputParser(BaseOutputParser[str]):
     def parse(self, text: str) -> str:
         json_str = extract_json_from_response(text)
-        print(json_str)
+        logger.debug(json_str)
         try:
             return json.loads(json_str)
         except json.JSONDecodeError as e:
@@ -0,0 +1,112 @@
+import functools
+import json
+import time
+import uuid
+
+from storage.cache import WEEK_TTL
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Cosine similarity above which two texts are treated as the same story
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+DEFAULT_MAX_ENTRIES = 10000
+
+
+@functools.cache
+def _collection(collection_name: str, persist_directory: str):
+    """Open the cache collection once per process, embedded with Chroma's default MiniLM encoder"""
+    # Deferred so importing the summarize service doesn't load chromadb until the first lookup
+    import chromadb
+
+    client = chromadb.PersistentClient(path=persist_directory)
+    return client.get_or_create_collection(collection_name, metadata={"hnsw:space": "cosine"})
+
+
+def _evict(collection, max_entries: int):
+    """Drop expired entries, then the oldest ones beyond max_entries"""
+    results = collection.get(include=["metadatas"])
+    now = time.time()
+    # Entries written before the timestamps were stored sort first and count as expired
+    entries = sorted(zip(results["ids"], results["metadatas"]), key=lambda entry: entry[1].get("created_ts", 0))
+    expired = [doc_id for doc_id, metadata in entries if metadata.get("expires_ts", 0) < now]
+    live = [doc_id for doc_id, metadata in entries if metadata.get("expires_ts", 0) >= now]
+    # Trim 10% below the cap so eviction doesn't run on every insert
+    overflow = len(live) - int(max_entries * 0.9)
+    stale = expired + (live[:overflow] if overflow > 0 else [])
+    if stale:
+        collection.delete(ids=stale)
+        logger.debug(f"Evicted {len(stale)} semantic cache entries")
+
+
+def _live_in_scope(scope: str) -> dict:
+    """Chroma where filter matching unexpired entries of one scope"""
+    return {"$and": [{"scope": scope}, {"expires_ts": {"$gte": time.time()}}]}
+
+
+def semantic_cached(
+    collection_name: str,
+    threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    ttl_seconds: int = WEEK_TTL,
+    persist_directory: str = "chroma_db",
+    scope_kwarg: str = "ticker",
+):
+    """
+    A decorator for functions taking a text as first argument and returning a dict or a string:
+    - embeds the text and looks up the most similar unexpired text cached under the same scope,
+    - returns the cached result when the cosine similarity is above threshold,
+    - otherwise calls the decorated function and caches non-empty results.
+    Republished or lightly rewritten stories then skip the LLM entirely.
+
+    The scope is the keyword argument named scope_kwarg (the ticker by default). The encoder only
+    sees the first 256 tokens, so texts about different companies sharing a lead would match;
+    calls without a scope skip the cache.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(text: str, *args, **kwargs):
+            scope = kwargs.get(scope_kwarg)
+            if not scope:
+                return func(text, *args, **kwargs)
+            scope = str(scope).upper()
+
+            try:
+                collection = _collection(collection_name, persist_directory)
+                if collection.count():
+                    hit = collection.query(
+                        query_texts=[text],
+                        n_results=1,
+                        where=_live_in_scope(scope),
+                        include=["metadatas", "distances"],
+                    )
+                    if hit["ids"][0] and 1 - hit["distances"][0][0] >= threshold:
+                        logger.debug(f"Semantic cache hit in {collection_name} for {scope}")
+                        return json.loads(hit["metadatas"][0][0]["result"])
+            except Exception as e:
+                logger.error(f"Semantic cache lookup failed: {e}")
+                return func(text, *args, **kwargs)
+
+            result = func(text, *args, **kwargs)
+            if not result or not isinstance(result, (dict, str)):
+                return result
+
+            try:
+                now = time.time()
+                collection.add(
+                    documents=[text],
+                    metadatas=[{
+                        "result": json.dumps(result),
+                        "scope": scope,
+                        "created_ts": now,
+                        "expires_ts": now + ttl_seconds,
+                    }],
+                    ids=[str(uuid.uuid4())],
+                )
+                if collection.count() > max_entries:
+                    _evict(collection, max_entries)
+            except Exception as e:
+                logger.error(f"Semantic cache insert failed: {e}")
+            return result
+        return wrapper
+    return decorator
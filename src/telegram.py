@@ -1,7 +1,18 @@
+import asyncio
+import atexit
+import hmac
 import os
+import queue
+import random
+import threading
 import time
+from functools import lru_cache
+from html import escape as _html_escape
+from urllib.parse import urlencode
 
-import requests
+import aiohttp
+from aiohttp import web
+import httpx
 from event_driven.event_bus import EventBus, EventType
 from ml_serving.utils import dump_failed_text
 from logger import get_logger
@@ -9,6 +20,147 @@ from logger import get_logger
 logger = get_logger("telegram")
 
 DEFAULT_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+# TELEGRAM_WEBHOOK_URL (public HTTPS URL Telegram pushes updates to) and TELEGRAM_WEBHOOK_SECRET
+# are read when listening starts; long polling is used unless both are set
+WEBHOOK_PATH = "/telegram-webhook"
+WEBHOOK_PORT = int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8443"))
+_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Seconds Telegram holds a getUpdates request open waiting for updates
+POLL_TIMEOUT = 50
+MAX_POLL_BACKOFF = 60
+
+# All sends share one HTTP/2 connection; queued batches are multiplexed over it
+_HTTP_LIMITS = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+_FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+SEND_BATCH_SIZE = 16
+# Attempts per message; 429s wait the retry_after Telegram asks for, 5xx back off exponentially
+SEND_MAX_ATTEMPTS = 4
+_sync_client = httpx.Client(transport=httpx.HTTPTransport(http2=True, retries=3, limits=_HTTP_LIMITS), timeout=10)
+
+# Outgoing messages are posted by a background thread so the poller never waits on a send
+_SEND_QUEUE: queue.Queue = queue.Queue(maxsize=256)
+_send_worker_lock = threading.Lock()
+_send_worker = None
+ASYNC_SEND_CONCURRENCY = 16
+_async_send_limit = asyncio.Semaphore(ASYNC_SEND_CONCURRENCY)
+
+
+@lru_cache(maxsize=8)
+def _api_url(method: str) -> str:
+    """
+    Bot API URL for a method, built once on first use.
+    Not at import: main() loads the --env file after this module is imported.
+    """
+    return f"https://api.telegram.org/bot{os.getenv('TELEGRAM_BOT_TOKEN')}/{method}"
+
+
+def _escape_html(text) -> str:
+    """Escape HTML characters in strings"""
+    return _html_escape(text, quote=False) if isinstance(text, str) else str(text)
+
+
+def _format_list(items) -> str:
+    """Format a list as bullet lines"""
+    if not items:
+        return "None"
+    if not isinstance(items, (list, tuple)):
+        return _escape_html(items)
+    return "• " + "\n• ".join(map(_escape_html, items))
+
+
+# Bookkeeping added by the request pipeline, never shown to users
+_INTERNAL_FIELDS = frozenset({"request_id", "requested_by"})
+
+
+@lru_cache(maxsize=256)
+def _display_key(key: str) -> str:
+    """Title-case a strategy key once; keys come from a small, mostly fixed set"""
+    return key.replace("_", " ").title()
+
+
+def _format_dict(data) -> str:
+    """Format a nested dictionary as labelled lines"""
+    if not isinstance(data, dict):
+        return _escape_html(data)
+
+    formatted = []
+    for key, value in data.items():
+        if key in _INTERNAL_FIELDS:
+            continue
+        key_display = _display_key(key)
+
+        if isinstance(value, list):
+            formatted.append(f"<b>{key_display}:</b>\n{_format_list(value)}")
+        else:
+            formatted.append(f"<b>{key_display}:</b> {_escape_html(value)}")
+
+    return "\n".join(formatted)
+
+
+# Field formatters return the text following the "<b>Label:</b>" prefix
+def _plain(value) -> str:
+    return f" {value}"
+
+
+def _text(value) -> str:
+    return f" {_escape_html(value)}"
+
+
+def _percent(value) -> str:
+    return f" {value}%"
+
+
+def _bullets(items) -> str:
+    return f"\n{_format_list(items)}"
+
+
+def _section(data) -> str:
+    return f"\n{_format_dict(data)}"
+
+
+# (label, key, formatter) in display order; keys missing from the result are skipped
+_HOLD_SCHEMA = (
+    ("Symbol", "symbol", _plain),
+    ("Purchase Price", "purchase_price", _plain),
+    ("Current Price", "current_price", _plain),
+    ("Unrealized Gain/Loss", "unrealized_gain_loss_pct", _percent),
+    ("Rating", "rating", _plain),
+    ("Confidence", "confidence", _plain),
+    ("Reasoning", "reasoning", _text),
+    ("Hold Factors", "hold_factors", _bullets),
+    ("Risk Factors", "risk_factors", _bullets),
+    ("Exit Conditions", "exit_conditions", _bullets),
+    ("Macro Impact", "macro_impact", _text),
+    ("Exit Strategy", "exit_strategy", _section),
+)
+_BUY_SCHEMA = (
+    ("Symbol", "symbol", _plain),
+    ("Rating", "rating", _plain),
+    ("Confidence", "confidence", _plain),
+    ("Reasoning", "reasoning", _text),
+    ("Bullish Factors", "bullish_factors", _bullets),
+    ("Bearish Factors", "bearish_factors", _bullets),
+    ("Macro Impact", "macro_impact", _text),
+    ("Enter Strategy", "enter_strategy", _section),
+    ("Exit Strategy", "exit_strategy", _section),
+)
+
+
+def _compile_schema(schema: tuple) -> tuple:
+    """Precompute the bold label prefix of every field"""
+    return tuple((f"<b>{label}:</b>", key, formatter) for label, key, formatter in schema)
+
+
+_HOLD_FIELDS = _compile_schema(_HOLD_SCHEMA)
+_BUY_FIELDS = _compile_schema(_BUY_SCHEMA)
+_SEP = "\n\n"
+# Shown as N/A when missing
+_ALWAYS_SHOWN = frozenset({"symbol", "rating", "confidence"})
+
+
+def _validate(result) -> bool:
+    """A formattable analysis is a non-empty dict with a symbol"""
+    return isinstance(result, dict) and "symbol" in result
 
 
 def format_investment_message(result: dict) -> str:
@@ -16,150 +168,216 @@ def format_investment_message(result: dict) -> str:
     Format investment analysis result for Telegram with HTML formatting.
     Handles both string-based fields and complex nested structures.
     Supports both standard analysis and hold position analysis schemas.
+    Only schema fields are rendered, so internal fields like request_id never show up.
     """
-    try:
-        if not result:
-            return "No analysis results available."
-
-        # Helper function to escape HTML characters in strings
-        def escape_html(text):
-            if isinstance(text, str):
-                return text.replace("<", "&lt;").replace(">", "&gt;")
-            return str(text)
-
-        # Helper function to format lists
-        def format_list(items):
-            if not items:
-                return "None"
-            return "\n".join(f"• {escape_html(item)}" for item in items)
-
-        # Helper function to format nested dictionaries
-        def format_dict(data):
-            if isinstance(data, str):
-                return escape_html(data)
-
-            if not isinstance(data, dict):
-                return escape_html(data)
-
-            formatted = []
-            for key, value in data.items():
-                key_display = key.replace("_", " ").title()
-
-                if isinstance(value, list):
-                    formatted.append(f"<b>{key_display}:</b>\n{format_list(value)}")
-                else:
-                    formatted.append(f"<b>{key_display}:</b> {escape_html(value)}")
-
-            return "\n".join(formatted)
-
-        # Filter out internal fields that shouldn't be displayed
-        displayed_result = {k: v for k, v in result.items() 
-                        if k not in ['request_id', 'requested_by']}
-        
-        # Start building message
-        message_parts = [
-            f"<b>Symbol:</b> {displayed_result.get('symbol', 'N/A')}",
-            f"<b>Rating:</b> {displayed_result.get('rating', 'N/A')}",
-            f"<b>Confidence:</b> {displayed_result.get('confidence', 'N/A')}",
-        ]
-        
-        # Detect if this is a hold position analysis by checking for specific fields
-        is_hold_analysis = 'purchase_price' in displayed_result
-        
-        # Add hold position specific information
-        if is_hold_analysis:
-            # Add purchase info
-            if "purchase_price" in displayed_result:
-                message_parts.insert(1, f"<b>Purchase Price:</b> {displayed_result.get('purchase_price', 'N/A')}")
-            
-            # Add current price if available
-            if "current_price" in displayed_result:
-                message_parts.insert(2, f"<b>Current Price:</b> {displayed_result.get('current_price', 'N/A')}")
-            
-            # Add unrealized gain/loss if available
-            if "unrealized_gain_loss_pct" in displayed_result:
-                message_parts.insert(3, f"<b>Unrealized Gain/Loss:</b> {displayed_result.get('unrealized_gain_loss_pct', 'N/A')}%")
-
-        # Add reasoning
-        if "reasoning" in displayed_result:
-            message_parts.append(f"<b>Reasoning:</b> {escape_html(displayed_result['reasoning'])}")
-
-        # Add factors based on schema type
-        if is_hold_analysis:
-            # Add hold factors if available
-            if "hold_factors" in displayed_result:
-                message_parts.append(
-                    f"<b>Hold Factors:</b>\n{format_list(displayed_result['hold_factors'])}"
-                )
-                
-            # Add risk factors if available
-            if "risk_factors" in displayed_result:
-                message_parts.append(
-                    f"<b>Risk Factors:</b>\n{format_list(displayed_result['risk_factors'])}"
-                )
-            
-            # Add exit conditions if available
-            if "exit_conditions" in displayed_result:
-                message_parts.append(
-                    f"<b>Exit Conditions:</b>\n{format_list(displayed_result['exit_conditions'])}"
-                )
-        else:
-            # Add bullish factors if available
-            if "bullish_factors" in displayed_result:
-                message_parts.append(
-                    f"<b>Bullish Factors:</b>\n{format_list(displayed_result['bullish_factors'])}"
-                )
-
-            # Add bearish factors if available
-            if "bearish_factors" in displayed_result:
-                message_parts.append(
-                    f"<b>Bearish Factors:</b>\n{format_list(displayed_result['bearish_factors'])}"
-                )
-
-        # Add macro impact if available
-        if "macro_impact" in displayed_result:
-            message_parts.append(
-                f"<b>Macro Impact:</b> {escape_html(displayed_result.get('macro_impact', ''))}"
-            )
-
-        # Add strategy sections based on schema type
-        if is_hold_analysis:
-            # Add exit strategy
-            if "exit_strategy" in displayed_result:
-                message_parts.append(
-                    f"<b>Exit Strategy:</b>\n{format_dict(displayed_result['exit_strategy'])}"
-                )
-        else:
-            # Add enter strategy
-            if "enter_strategy" in displayed_result:
-                message_parts.append(
-                    f"<b>Enter Strategy:</b>\n{format_dict(displayed_result['enter_strategy'])}"
-                )
-
-            # Add exit strategy
-            if "exit_strategy" in displayed_result:
-                message_parts.append(
-                    f"<b>Exit Strategy:</b>\n{format_dict(displayed_result['exit_strategy'])}"
-                )
-
-        return "\n\n".join(message_parts)
-    
-    except Exception as e:
-        # Import needed only if there's an exception
-        error_message = f"Failed to format message: {str(e)}\nOriginal data: {str(result)}"
-        dump_failed_text(error_message)
-        return f"Error formatting analysis results. Details have been logged. Error: {str(e)}"
+    if not result:
+        return "No analysis results available."
+    if not _validate(result):
+        dump_failed_text(f"Failed to format message: missing symbol\nOriginal data: {result}")
+        return "Error formatting analysis results. Details have been logged. Error: missing symbol"
+
+    # Hold position analyses carry the purchase price
+    fields = _HOLD_FIELDS if "purchase_price" in result else _BUY_FIELDS
+
+    return _SEP.join(
+        prefix + formatter(result.get(key, "N/A"))
+        for prefix, key, formatter in fields
+        if key in result or key in _ALWAYS_SHOWN
+    )
+
+
+def _encode_message(chat_id, content: str) -> bytes:
+    """Form-encode a sendMessage payload once, on the caller's thread"""
+    return urlencode({"chat_id": chat_id, "text": content, "parse_mode": "HTML"}).encode()
+
+
+def _retry_delay(response: httpx.Response, attempt: int):
+    """Seconds to wait before resending a failed sendMessage, None if it shouldn't be retried"""
+    if attempt + 1 >= SEND_MAX_ATTEMPTS:
+        return None
+    if response.status_code == 429:
+        # Flood control, Telegram says how long the chat is blocked
+        try:
+            return float(response.json()["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            return 2 ** attempt
+    if response.status_code >= 500:
+        return 2 ** attempt * (0.5 + random.random())
+    return None
+
+
+def _post_message(body: bytes):
+    """POST one encoded sendMessage payload, retrying throttled and 5xx responses"""
+    for attempt in range(SEND_MAX_ATTEMPTS):
+        try:
+            response = _sync_client.post(_api_url("sendMessage"), content=body, headers=_FORM_HEADERS)
+        except Exception as e:
+            logger.error(f"Failed to send Telegram message: {e}")
+            return
+        if response.is_success:
+            return
+        delay = _retry_delay(response, attempt)
+        if delay is None:
+            # The body is only needed when the send failed
+            logger.warning(f"Telegram send failed: {response.text}")
+            return
+        logger.warning(f"Telegram send got {response.status_code}, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+async def _apost_message(client: httpx.AsyncClient, body: bytes):
+    """POST one encoded sendMessage payload on the sender's event loop, retrying throttled and 5xx responses"""
+    for attempt in range(SEND_MAX_ATTEMPTS):
+        try:
+            response = await client.post(_api_url("sendMessage"), content=body, headers=_FORM_HEADERS)
+        except Exception as e:
+            logger.error(f"Failed to send Telegram message: {e}")
+            return
+        if response.is_success:
+            return
+        delay = _retry_delay(response, attempt)
+        if delay is None:
+            logger.warning(f"Telegram send failed: {response.text}")
+            return
+        logger.warning(f"Telegram send got {response.status_code}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+async def _apost_in_order(client: httpx.AsyncClient, bodies: list):
+    """Send one chat's messages one after another, so they arrive in order and within its flood limit"""
+    for body in bodies:
+        await _apost_message(client, body)
+
+
+async def _adrain_send_queue():
+    """
+    Send queued messages in batches of up to SEND_BATCH_SIZE over one HTTP/2 connection.
+    Different chats are sent concurrently, messages to the same chat sequentially.
+    """
+    transport = httpx.AsyncHTTPTransport(http2=True, retries=3, limits=_HTTP_LIMITS)
+    async with httpx.AsyncClient(transport=transport, timeout=10) as client:
+        while True:
+            # Blocking here is fine, this loop has nothing else to run while the queue is empty
+            batch = [_SEND_QUEUE.get()]
+            while len(batch) < SEND_BATCH_SIZE:
+                try:
+                    batch.append(_SEND_QUEUE.get_nowait())
+                except queue.Empty:
+                    break
+            by_chat = {}
+            for chat_id, body in batch:
+                by_chat.setdefault(chat_id, []).append(body)
+            try:
+                await asyncio.gather(*(_apost_in_order(client, bodies) for bodies in by_chat.values()))
+            finally:
+                for _ in batch:
+                    _SEND_QUEUE.task_done()
+
+
+def _drain_send_queue():
+    """Sender thread entry point"""
+    asyncio.run(_adrain_send_queue())
+
+
+def _ensure_send_worker():
+    """Start the sender thread on first use"""
+    global _send_worker
+    with _send_worker_lock:
+        if _send_worker is None:
+            _send_worker = threading.Thread(target=_drain_send_queue, name="telegram_sender", daemon=True)
+            _send_worker.start()
+            # Deliver pending messages before the interpreter exits
+            atexit.register(_SEND_QUEUE.join)
+
 
 def send_text_via_telegram(content: str, chat_id: str=DEFAULT_CHAT_ID):
     """
-    Sends a message via Telegram Bot with Markdown formatting.
-    Escapes special characters to avoid parsing errors.
+    Sends a message via Telegram Bot with HTML formatting.
+    The message is queued for a background sender thread, so this returns immediately;
+    if the queue is full it's sent synchronously instead.
     """
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    data = {"chat_id": chat_id, "text": content, "parse_mode": "HTML"}
-    response = requests.post(url, data=data)
-    logger.info(f"Telegram message sent. Response: {response.json()}")
+    body = _encode_message(chat_id, content)
+    _ensure_send_worker()
+    try:
+        _SEND_QUEUE.put_nowait((chat_id, body))
+    except queue.Full:
+        logger.warning("Telegram send queue full, sending synchronously")
+        _post_message(body)
+
+
+def _analyze_hold(chat_id, args: list) -> str:
+    """/analyze_hold {ticker} {purchase_price}"""
+    if len(args) < 2:
+        return "Invalid command format for /analyze_hold. Usage: /analyze_hold {ticker} {purchase_price}"
+
+    ticker = args[0].upper()
+    purchase_price = args[1]
+
+    # Publish the event to the EventBus for priority analysis
+    EventBus().publish(
+        EventType.TELEGRAM_COMMAND,
+        {
+            "action": "own",
+            "ticker": ticker,
+            "purchase_price": purchase_price,
+            "chat_id": chat_id,
+        },
+    )
+    return f"Adding {ticker} (owned at {purchase_price}) to analysis queue with high priority"
+
+
+def _analyze(chat_id, args: list) -> str:
+    """/analyze {ticker}"""
+    if not args:
+        return "Invalid command format for /analyze. Usage: /analyze {ticker}"
+
+    ticker = args[0].upper()
+
+    # Publish the event to the EventBus for priority analysis
+    EventBus().publish(
+        EventType.TELEGRAM_COMMAND,
+        {
+            "action": "buy",
+            "ticker": ticker,
+            "chat_id": chat_id,
+        },
+    )
+    return f"Adding {ticker} to analysis queue with high priority..."
+
+
+_COMMAND_HANDLERS = {
+    "/analyze": _analyze,
+    "/analyze_hold": _analyze_hold,
+}
+
+
+def process_telegram_update(update: dict) -> tuple:
+    """
+    Processes /analyze_hold and /analyze commands from an incoming Telegram update.
+    Adds commands to the analysis queue.
+
+    Returns:
+        The chat id and the confirmation message to report back to the user,
+        or (None, None) for updates that aren't bot commands
+    """
+    # Busy chats are mostly plain messages and other update kinds, reject them before any parsing
+    message = update.get("message")
+    if not message:
+        return None, None
+    text = message.get("text")
+    if not text or not text.startswith("/"):
+        return None, None
+
+    chat_id = message["chat"]["id"]
+    # Commands take at most two arguments, don't split the rest of long messages
+    parts = text.split(maxsplit=3)
+
+    # Group chats address commands as /command@bot_name
+    command = parts[0].split("@", 1)[0] if parts else ""
+    handler = _COMMAND_HANDLERS.get(command)
+    if handler is None:
+        return chat_id, "Command not recognized. Available commands: /analyze {ticker} or /analyze_hold {ticker} {purchase_price}"
+    return chat_id, handler(chat_id, parts[1:])
 
 
 def handle_telegram_update(update: dict):
@@ -167,102 +385,172 @@ def handle_telegram_update(update: dict):
     Handles incoming Telegram updates and processes /analyze_hold and /analyze commands.
     Adds commands to the analysis queue and reports back to the user.
     """
-    message = update.get("message", {})
-    chat_id = message.get("chat", {}).get("id")
-    text = message.get("text", "").strip()
-
-    if text.startswith("/analyze_hold"):
-        parts = text.split()
-        if len(parts) >= 3:
-            ticker = parts[1].upper()
-            purchase_price = parts[2]
-            confirmation_msg = f"Adding {ticker} (owned at {purchase_price}) to analysis queue with high priority"
-
-            # Publish the event to the EventBus for priority analysis
-            EventBus().publish(
-                EventType.TELEGRAM_COMMAND,
-                {
-                    "action": "own",
-                    "ticker": ticker,
-                    "purchase_price": purchase_price,
-                    "chat_id": chat_id,
-                },
-            )
-        else:
-            confirmation_msg = "Invalid command format for /analyze_hold. Usage: /analyze_hold {ticker} {purchase_price}"
-
-    elif text.startswith("/analyze"):
-        parts = text.split()
-        if len(parts) >= 2:
-            ticker = parts[1].upper()
-            confirmation_msg = (
-                f"Adding {ticker} to analysis queue with high priority..."
-            )
-
-            # Publish the event to the EventBus for priority analysis
-            EventBus().publish(
-                EventType.TELEGRAM_COMMAND,
-                {
-                    "action": "buy",
-                    "ticker": ticker,
-                    "chat_id": chat_id,
-                },
-            )
-        else:
-            confirmation_msg = (
-                "Invalid command format for /analyze. Usage: /analyze {ticker}"
-            )
-
-    else:
-        confirmation_msg = "Command not recognized. Available commands: /analyze {ticker} or /analyze_hold {ticker} {purchase_price}"
-
+    chat_id, confirmation_msg = process_telegram_update(update)
+    if confirmation_msg is None:
+        return
     # Send confirmation message back to user
     send_text_via_telegram(confirmation_msg, chat_id)
 
 
-def listen_to_telegram():
+async def send_text_via_telegram_async(session: aiohttp.ClientSession, content: str, chat_id: str = DEFAULT_CHAT_ID):
+    """
+    Sends a message via Telegram Bot with HTML formatting on the listener's event loop.
+    At most ASYNC_SEND_CONCURRENCY sends are in flight at once.
+    """
+    data = {"chat_id": chat_id, "text": content, "parse_mode": "HTML"}
+    async with _async_send_limit:
+        try:
+            async with session.post(_api_url("sendMessage"), data=data, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                if not response.ok:
+                    logger.warning(f"Telegram send failed: {await response.text()}")
+        except Exception as e:
+            logger.error(f"Failed to send Telegram message to {chat_id}: {e}")
+
+
+async def alisten_to_telegram():
     """
     Listens for incoming Telegram updates using long polling without storing state.
     Uses Telegram's offset parameter to mark messages as read.
+    Confirmations are sent as concurrent tasks while the next long poll is already open.
     """
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-    url = f"https://api.telegram.org/bot{bot_token}/getUpdates"
+    # Keep references so pending send tasks aren't garbage collected
+    pending_sends = set()
 
-    # First, get the current update_id to start from
-    try:
-        # Get the latest update_id without processing messages
-        response = requests.get(f"{url}?limit=1")
-        result = response.json().get("result", [])
+    async with aiohttp.ClientSession() as session:
+        # getUpdates is refused while a webhook is registered
+        try:
+            async with session.post(_api_url("deleteWebhook"), timeout=aiohttp.ClientTimeout(total=10)) as response:
+                await response.read()
+        except Exception as e:
+            logger.error(f"Error removing Telegram webhook: {e}")
 
-        # If there are any updates, start from the next one
-        offset = result[0]["update_id"] + 1 if result else None
-        logger.info(f"Starting Telegram listener from update_id: {offset or 'latest'}")
+        # First, get the current update_id to start from
+        try:
+            # Get the latest update_id without processing messages
+            async with session.get(
+                _api_url("getUpdates"), params={"limit": 1}, timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                result = (await response.json()).get("result", [])
+
+            # If there are any updates, start from the next one
+            offset = result[0]["update_id"] + 1 if result else None
+            logger.info(f"Starting Telegram listener from update_id: {offset or 'latest'}")
+        except Exception as e:
+            logger.error(f"Error initializing Telegram offset: {e}")
+            offset = None
+
+        backoff = 1
+        poll_timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)
+        while True:
+            try:
+                # Build parameters with offset if available
+                params = {"timeout": POLL_TIMEOUT}
+                if offset:
+                    params["offset"] = offset
+
+                # The HTTP timeout sits above the server-side hold so a hung socket can't wedge the loop
+                async with session.get(_api_url("getUpdates"), params=params, timeout=poll_timeout) as response:
+                    updates = (await response.json()).get("result", [])
+                backoff = 1
+                if not updates:
+                    # Spread re-polls so clients don't all reconnect on the same timeout boundary
+                    await asyncio.sleep(random.uniform(0, 0.5))
+
+                for update in updates:
+                    # Always increment offset to mark as read for next poll
+                    offset = update["update_id"] + 1
+                    chat_id, confirmation_msg = process_telegram_update(update)
+                    if confirmation_msg is None:
+                        continue
+                    task = asyncio.create_task(send_text_via_telegram_async(session, confirmation_msg, chat_id))
+                    pending_sends.add(task)
+                    task.add_done_callback(pending_sends.discard)
+
+            except Exception as e:
+                delay = backoff * (0.5 + random.random())
+                logger.error(f"Error in Telegram listener: {e}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, MAX_POLL_BACKOFF)
+            # No sleep on success: the long poll itself waits for the next update
+
+
+async def _handle_webhook(request: web.Request) -> web.Response:
+    """
+    Receive one update pushed by Telegram.
+    The confirmation is returned as a sendMessage call in the response body,
+    which Telegram executes without a separate API request.
+    """
+    if not hmac.compare_digest(request.headers.get(_SECRET_HEADER, ""), request.app["secret"]):
+        return web.Response(status=403)
+    try:
+        update = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+    if not isinstance(update, dict):
+        return web.Response(status=400)
+    chat_id, confirmation_msg = process_telegram_update(update)
+    if confirmation_msg is None:
+        return web.Response()
+    return web.json_response(
+        {"method": "sendMessage", "chat_id": chat_id, "text": confirmation_msg, "parse_mode": "HTML"}
+    )
+
+
+async def _aset_webhook(url: str, secret: str) -> bool:
+    """Register the webhook with Telegram, True if the Bot API accepted it"""
+    payload = {"url": url, "max_connections": 40, "allowed_updates": ["message"], "secret_token": secret}
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                _api_url("setWebhook"), json=payload, timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                result = await response.json()
     except Exception as e:
-        logger.error(f"Error initializing Telegram offset: {e}")
-        offset = None
+        logger.error(f"Error setting Telegram webhook: {e}")
+        return False
+    if not result.get("ok"):
+        logger.error(f"Telegram refused webhook {url}: {result.get('description')}")
+        return False
+    logger.info(f"Telegram webhook set to {url}")
+    return True
 
-    while True:
-        try:
-            # Build parameters with offset if available
-            params = {"timeout": 100}
-            if offset:
-                params["offset"] = offset
 
-            response = requests.get(url, params=params)
-            updates = response.json().get("result", [])
+async def aserve_telegram_webhook(url: str, secret: str):
+    """
+    Registers url with Telegram and serves pushed updates on WEBHOOK_PORT.
+    Telegram only calls in when there's traffic, so there's no idle polling.
+    Updates without the secret token header are rejected; falls back to long polling
+    if Telegram doesn't accept the webhook.
+    """
+    app = web.Application()
+    app["secret"] = secret
+    app.router.add_post(WEBHOOK_PATH, _handle_webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", WEBHOOK_PORT).start()
 
-            for update in updates:
-                handle_telegram_update(update)
-                # Always increment offset to mark as read for next poll
-                offset = update["update_id"] + 1
+    try:
+        if await _aset_webhook(url, secret):
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+    logger.warning("Falling back to long polling")
+    await alisten_to_telegram()
 
-        except Exception as e:
-            logger.error(f"Error in Telegram listener: {e}")
-            # Wait slightly longer on error
-            time.sleep(5)
-            continue
 
-        time.sleep(15)
+def listen_to_telegram():
+    """
+    Receive Telegram updates, blocking the calling thread.
+    Uses the webhook server when TELEGRAM_WEBHOOK_URL and TELEGRAM_WEBHOOK_SECRET are set,
+    long polling otherwise.
+    """
+    url = os.getenv("TELEGRAM_WEBHOOK_URL")
+    secret = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+    if url and not secret:
+        # Without the secret anyone reaching the port could queue analysis commands
+        logger.error("TELEGRAM_WEBHOOK_URL is set without TELEGRAM_WEBHOOK_SECRET, refusing webhook mode")
+    asyncio.run(aserve_telegram_webhook(url, secret) if url and secret else alisten_to_telegram())
 
 
 def test_send_text_via_telegram():
@@ -1,66 +1,86 @@
 from typing import Any
-import os
-from dotenv import load_dotenv
 
-from ml_serving.utils import SUMMARIZE_PROMPT_V2, SUMMARIZE_PROMPT_V3, SYSTEM_PROMPT, SummaryResponse, dump_failed_text, extract_json_from_response
-from langchain_community.llms.mlx_pipeline import MLXPipeline
-from langchain_community.chat_models.mlx import ChatMLX
-from langchain.schema.messages import HumanMessage, SystemMessage
+from ml_serving.config import MLX_MODEL_PATH
+from ml_serving.mlx_engine import generate_batch, generate_cached, load_model
+from ml_serving.prompts import STOCK_SUMMARIZE_SYSTEM_PROMPT, SUMMARY_JSON_REMINDER, format_summarize_prompt, summarize_prompt_parts
+from ml_serving.retry import retry_transient
+from ml_serving.utils import batch_summaries, dump_failed_text, extract_json_from_response, parse_summary
 from logger import get_logger
 
-# Load environment variables from the project root
-load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env"))
+# Nothing is loaded at import, load_model caches one model per path on first use
+# The SummaryResponse JSON fits well within this, and decoding stops once the object closes
+MAX_TOKENS = 1024
 
-# Path to the local model file
-MODEL_PATH = "/Users/roy.belio/Repos/QSBets/ml_serving/mlx_model"
+logger = get_logger(__name__)
 
-# System prompt for stock analysis
-STOCK_SYSTEM_PROMPT = "You are an expert stock analyst. Always provide your analysis in the requested JSON format."
-llm = MLXPipeline.from_model_id(
-    model_id=MODEL_PATH, pipeline_kwargs={"max_tokens": 2048, "verbose": True}
-)
-chatmlx = ChatMLX(llm=llm)
 
-logger = get_logger(__name__)
+def warmup(prompt_version=3, model_path: str = MLX_MODEL_PATH):
+    """
+    Load the model and prefill the system prompt and template prefix,
+    so the first real request only pays for its own text.
+    """
+    load_model(model_path)
+    prefix, suffix = summarize_prompt_parts(3 if prompt_version == 3 else 2)
+    generate_cached(model_path, STOCK_SUMMARIZE_SYSTEM_PROMPT, prefix, "", suffix, max_tokens=1)
+
 
-def mlx_summarize(text: str, prompt_version=3) -> dict[str, Any]:
+def mlx_summarize(text: str, prompt_version=3, model_path: str = MLX_MODEL_PATH) -> dict[str, Any]:
     """
-    Summarize given text using the local MLX model with LangChain MLXPipeline.
+    Summarize given text with mlx_lm directly, reusing the prefilled
+    system prompt and template prefix across calls.
     
     Args:
         text: The text to summarize
         prompt_version: Version of prompt to use (2 or 3)
-        model_path: Path to the local MLX model (default: mlx_model in the project)
+        model_path: Path of the MLX model to summarize with
         
     Returns:
         Dictionary with summarized information
     """
-    max_attempts = 2
-    attempt = 1
+    prefix, suffix = summarize_prompt_parts(3 if prompt_version == 3 else 2)
+
+    @retry_transient(max_attempts=2)
+    def generate(user_suffix: str) -> dict[str, Any]:
+        response = generate_cached(
+            model_path, STOCK_SUMMARIZE_SYSTEM_PROMPT, prefix, text, user_suffix, max_tokens=MAX_TOKENS, stop_on_json=True
+        )
 
-    prompt = SUMMARIZE_PROMPT_V3 if prompt_version == 3 else SUMMARIZE_PROMPT_V2
-    formatted_prompt = prompt.format(text=text)
+        # Extract the JSON response from the text output
+        json_text = extract_json_from_response(response)
 
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=formatted_prompt)
-    ]
+        # Validate against the schema
+        return parse_summary(json_text)
 
-    while attempt <= max_attempts:
+    try:
         try:
-            # Generate response using the MLXPipeline
-            response = chatmlx.invoke(messages)
+            return generate(suffix)
+        except ValueError as e:
+            # Greedy decoding repeats the same reply, so only retry with the reminder appended
+            logger.warning(f"Invalid summary for {text[:15]}: {e}, retrying with a JSON reminder")
+            return generate(f"{suffix}\n\n{SUMMARY_JSON_REMINDER}")
+    except ValueError as e:
+        logger.error(f"Invalid summary for {text[:15]}: {e}")
+        dump_failed_text(prefix + text + suffix)
+        return {}
+    except Exception as e:
+        logger.error(f"Summarize failed for {text[:15]}: {e}")
+        return {}
 
-            # Extract the JSON response from the text output
-            json_text = extract_json_from_response(response.content)
 
-            # Validate against the schema
-            summarized_json = SummaryResponse.model_validate_json(json_text)
-            return summarized_json.model_dump()
-        except Exception as e:
-            logger.error(f"Attempt {attempt} {text[:15]} failed: {e}")
-            attempt += 1
-            if attempt > max_attempts:
-                dump_failed_text(formatted_prompt)
-                return {}
+def mlx_summarize_many(texts: list[str], prompt_version=3, model_path: str = MLX_MODEL_PATH) -> list[dict[str, Any]]:
+    """
+    Summarize several texts with a single batched MLX generation.
+
+    Args:
+        texts: The texts to summarize
+        prompt_version: Version of prompt to use (2 or 3)
+        model_path: Path of the MLX model to summarize with
 
+    Returns:
+        One summary dict per text, {} where summarizing failed
+    """
+    prompts = [format_summarize_prompt(text, 3 if prompt_version == 3 else 2) for text in texts]
+    return batch_summaries(
+        lambda batch: generate_batch(model_path, STOCK_SUMMARIZE_SYSTEM_PROMPT, batch, max_tokens=MAX_TOKENS),
+        prompts,
+    )
@@ -1,14 +1,46 @@
+import asyncio
 import sys
 import os
 import time
 
-from langchain.schema import Document
-
 # Add project root to path if running directly
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
-from ml_serving.ai_service import map_reduce_summarize
+from ollama import AsyncClient
+
+from ml_serving.config import OLLAMA_HOST, OLLAMA_MODEL
+from ml_serving.prompts import STOCK_SUMMARIZE_SYSTEM_PROMPT, format_summarize_prompt
+from ml_serving.utils import SummaryResponse, extract_json_from_response, parse_summary
+
+# Match the server's OLLAMA_NUM_PARALLEL so requests overlap without queueing inside Ollama
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", min(8, os.cpu_count() or 1)))
+# Number of copies of the sample article to summarize
+NUM_ARTICLES = int(os.getenv("NUM_ARTICLES", "1"))
+
+
+async def ollama_summarize_async(client: AsyncClient, semaphore: asyncio.Semaphore, text: str) -> dict:
+    """Summarize one text with the async Ollama client"""
+    async with semaphore:
+        response = await client.chat(
+            model=OLLAMA_MODEL,
+            messages=[
+                {"role": "system", "content": STOCK_SUMMARIZE_SYSTEM_PROMPT},
+                {"role": "user", "content": format_summarize_prompt(text)},
+            ],
+            format=SummaryResponse.model_json_schema(),
+        )
+    json_text = extract_json_from_response(response["message"]["content"])
+    return parse_summary(json_text)
+
+
+async def _summarize_many(texts: list[str]) -> list:
+    """Summarize all texts concurrently, at most OLLAMA_NUM_PARALLEL at a time"""
+    semaphore = asyncio.Semaphore(OLLAMA_NUM_PARALLEL)
+    client = AsyncClient(host=OLLAMA_HOST)
+    return await asyncio.gather(
+        *(ollama_summarize_async(client, semaphore, text) for text in texts), return_exceptions=True
+    )
 
 
 def main():
@@ -35,35 +67,27 @@ Meanwhile, SentinelOne is seeing huge success upselling its Purple AI solution,
 Importantly, though, the company has a big catalyst later this year when enterprise PC vendor Lenovo will begin shipping all its PCs with SentinelOne's Singularity Platform on them. The two companies are also developing a new managed detection and response (MDR) service using AI and endpoint detection and response (EDR) capabilities based on the Singularity Platform. Lenovo is the world's largest PC vendor, selling nearly 62 million units in 2024, so this is a big opportunity for SentinelOne.
 At the same time, the stock is attractively priced, trading at a P/E ratio of under 5 times fiscal 2026 analyst estimates.
 """
-    print("Running ollama_summarize test...")
-    try:
-        # Start the timer
-        start_time = time.time()
-        
-        summary = map_reduce_summarize([Document(text)])
-        
-        # Calculate and display elapsed time
-        elapsed_time = time.time() - start_time
-        print(f"\nOllama summarization completed in {elapsed_time:.2f} seconds")
-        
+    print(f"Running ollama_summarize test on {NUM_ARTICLES} articles, {OLLAMA_NUM_PARALLEL} in parallel...")
+    # Start the timer
+    start_time = time.time()
+
+    summaries = asyncio.run(_summarize_many([text] * NUM_ARTICLES))
+
+    # Calculate and display elapsed time
+    elapsed_time = time.time() - start_time
+    print(f"\nOllama summarization completed in {elapsed_time:.2f} seconds")
+
+    for summary in summaries:
+        if isinstance(summary, Exception):
+            print(f"\nError in ollama_summarize: {summary}")
+            continue
         print("\nSummary results:")
-        print(f"Title: {summary.get('title', 'N/A')}")
-        print(f"Summary: {summary.get('summary', 'N/A')}")
-        
-        # Print stock details if available
-        stocks = summary.get('stocks', [])
-        if stocks:
-            print("\nStocks mentioned:")
-            for stock in stocks:
-                print(f"- {stock.get('ticker', 'N/A')}: {stock.get('name', 'N/A')}")
-                print(f"  Pros: {', '.join(stock.get('pros', []))}")
-                print(f"  Cons: {', '.join(stock.get('cons', []))}")
-        
-        print("\nTest completed successfully!")
-        return summary
-    except Exception as e:
-        print(f"\nError in ollama_summarize: {e}")
-        return None
+        print(f"Date: {summary['date']}")
+        print(f"Source: {summary['source']}")
+        print(f"Symbol: {summary['relevant_symbol']}")
+        print(f"Summary: {summary['summary']}")
+
+    return summaries
 
 
 if __name__ == "__main__":
@@ -0,0 +1,30 @@
+import hashlib
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ml_serving.prompts import SUMMARIZE_PROMPT_V3, format_summarize_prompt
+
+# Summary cache keys depend on the prompt text, edits here invalidate cached summaries
+SUMMARIZE_PROMPT_V3_SHA256 = "a0c1ed2070914ad753ebe8c870b45ccb553d6ff017f153cc4dfa2e7b6ddf5a0e"
+
+
+def test_summarize_prompt_v3_is_pinned():
+    """
+    Fail loudly on accidental SUMMARIZE_PROMPT_V3 edits.
+    Update the pinned hash only when the prompt change is intentional.
+    """
+    digest = hashlib.sha256(SUMMARIZE_PROMPT_V3.encode()).hexdigest()
+    assert digest == SUMMARIZE_PROMPT_V3_SHA256, "SUMMARIZE_PROMPT_V3 changed, update the pinned hash if intended"
+
+
+def test_format_summarize_prompt_matches_template():
+    """The precomputed prefix/suffix must render exactly like str.format"""
+    text = "Revenue grew 36% to {unescaped} braces"
+    assert format_summarize_prompt(text) == SUMMARIZE_PROMPT_V3.format(text=text)
+
+
+if __name__ == "__main__":
+    test_summarize_prompt_v3_is_pinned()
+    test_format_summarize_prompt_matches_template()
+    print("All tests passed!")
@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ml_serving.retry import retry_transient
+
+
+def _flaky(error: Exception, failures: int):
+    """Build a function raising error for the first failures calls and counting every call"""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+
+    return fn, calls
+
+
+def test_transient_errors_are_retried():
+    fn, calls = _flaky(TimeoutError("timed out"), failures=2)
+    assert retry_transient(max_attempts=3, base_delay=0)(fn)() == "ok"
+    assert len(calls) == 3
+
+
+def test_schema_errors_are_not_retried():
+    fn, calls = _flaky(ValueError("bad json"), failures=1)
+    try:
+        retry_transient(max_attempts=3, base_delay=0)(fn)()
+        assert False, "ValueError should propagate"
+    except ValueError:
+        pass
+    assert len(calls) == 1
+
+
+def test_unknown_errors_are_retried_once():
+    fn, calls = _flaky(RuntimeError("boom"), failures=5)
+    try:
+        retry_transient(max_attempts=3, base_delay=0)(fn)()
+        assert False, "RuntimeError should propagate"
+    except RuntimeError:
+        pass
+    assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    test_transient_errors_are_retried()
+    test_schema_errors_are_not_retried()
+    test_unknown_errors_are_retried_once()
+    print("All tests passed!")
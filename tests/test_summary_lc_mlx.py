@@ -2,9 +2,9 @@ import json
 import os
 import sys
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
-from src.ml_serving.utils import get_chat
+from src.ml_serving.utils import dedupe_texts, get_chat, split_texts, tree_reduce
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
@@ -12,14 +12,35 @@ if project_root not in sys.path:
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.schema import Document
 from langchain.schema.runnable import RunnableConfig
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.language_models import LLM
+from langchain_core.outputs import GenerationChunk
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 
-from src.collectors.nasdaq import fetch_stock_news
 from langchain_core.messages import SystemMessage, HumanMessage
 
+MLX_MAX_CONCURRENCY = int(os.getenv("MLX_MAX_CONCURRENCY", "8"))
+# Chunk summaries keyed by (prompt, model), re-runs only call the model for unseen chunks
+LLM_CACHE_PATH = ".lc_mlx_llm_cache.db"
+SUMMARIZER_SYSTEM_MESSAGE = SystemMessage(content="You are a helpful assistant that summarizes text.")
+
+
+# Map: Summarize each chunk
+MAP_PROMPT = PromptTemplate.from_template("""Summarize the following text for the stock {stock}:
+    {text}
+    
+    Summary:""")
+
+# Reduce: Combine summaries
+REDUCE_PROMPT = PromptTemplate.from_template("""You are given a set of summaries extracted from a longer text about stock news.
+    Create a concise, technical, comprehensive summary that combines all the important information about this stock {stock}.
+    Focus on quantitative data: revenue growth percentages, earnings, EPS, P/E ratios, margins, risks, and opportunities, year-over-year comparisons.
+    
+    SUMMARIES:
+    {summaries}
+    
+    COMPREHENSIVE SUMMARY:""")
+
 
 class MLXServerLLM(LLM):
     """LangChain LLM implementation for MLX model server"""
@@ -39,9 +60,19 @@ class MLXServerLLM(LLM):
             # Use default initialization
             self.model_server = get_chat()
 
+    @property
     def _llm_type(self) -> str:
         return "mlx_server"
 
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        """Part of the LLM cache key, so summaries from different models don't collide"""
+        return {"model_path": self.model_path}
+
+    @staticmethod
+    def _messages(prompt: str) -> list:
+        return [SUMMARIZER_SYSTEM_MESSAGE, HumanMessage(content=prompt)]
+
     def _call(
         self,
         prompt: str,
@@ -50,84 +81,89 @@ class MLXServerLLM(LLM):
         **kwargs
     ) -> str:
         """Process a prompt synchronously with the MLX model server"""
-        messages = [
-            SystemMessage(content="You are a helpful assistant that summarizes text."),
-            HumanMessage(content=prompt)
-        ]
+        return self.model_server.invoke(self._messages(prompt), stop=stop).content
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[BaseCallbackHandler] = None,
+        **kwargs
+    ) -> str:
+        """Process a prompt without blocking the event loop, so concurrent ainvoke/abatch calls overlap"""
+        return (await self.model_server.ainvoke(self._messages(prompt), stop=stop)).content
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[BaseCallbackHandler] = None,
+        **kwargs
+    ) -> Iterator[GenerationChunk]:
+        """Stream the reply token by token from the MLX model server"""
+        for chunk in self.model_server.stream(self._messages(prompt), stop=stop):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content)
+            yield GenerationChunk(text=chunk.content)
+
 
-        # Use synchronous processing
-        result = self.model_server.process_sync(messages)
+# One LLM wrapper per model path, so repeated summarizations don't spin up another model server
+_LLM_SINGLETONS: Dict[str, MLXServerLLM] = {}
 
-        if "error" in result:
-            raise RuntimeError(f"MLX model error: {result['error']}")
 
-        return result.get("content", "")
+def get_mlx_llm(path: Optional[str] = None) -> MLXServerLLM:
+    """Return the shared MLXServerLLM for a model path, the default model when path is None"""
+    key = path or "_default"
+    if key not in _LLM_SINGLETONS:
+        _LLM_SINGLETONS[key] = MLXServerLLM(model_path=path)
+    return _LLM_SINGLETONS[key]
 
 
 def map_reduce_summarize(documents: List[Document], stock: str, chunk_size: int = 10000):
     """Implement map-reduce summarization using langchain"""
-    # Initialize the LLM
-    llm = MLXServerLLM()
-
-    # Create text splitter for chunking
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=100,
-        separators=["\n\n", "\n", " ", ""],
-        keep_separator=False
-    )
+    llm = get_mlx_llm()
 
     # Split documents into chunks
-    splits = []
-    for doc in documents:
-        chunks = text_splitter.split_text(doc.page_content)
-        for chunk in chunks:
-            splits.append(Document(page_content=chunk, metadata=doc.metadata))
+    splits = split_texts([doc.page_content for doc in documents], chunk_size)
 
-    print(f"Split {len(documents)} documents into {len(splits)} chunks")
+    # News items share boilerplate chunks, summarize each distinct chunk once
+    chunks, _ = dedupe_texts(splits)
+    print(f"Split {len(documents)} documents into {len(splits)} chunks, {len(chunks)} distinct")
 
-    # Map: Summarize each chunk
-    map_template = """Summarize the following text for the stock {stock}:
-    {text}
-    
-    Summary:"""
-    map_prompt = PromptTemplate.from_template(map_template)
-
-    map_chain = map_prompt | llm | StrOutputParser()
+    map_chain = MAP_PROMPT | llm | StrOutputParser()
+    reduce_chain = REDUCE_PROMPT | llm | StrOutputParser()
 
-    # Reduce: Combine summaries
-    reduce_template = """You are given a set of summaries extracted from a longer text about stock news.
-    Create a concise, technical, comprehensive summary that combines all the important information about this stock {stock}.
-    Focus on quantitative data: revenue growth percentages, earnings, EPS, P/E ratios, margins, risks, and opportunities, year-over-year comparisons.
-    
-    SUMMARIES:
-    {summaries}
-    
-    COMPREHENSIVE SUMMARY:"""
-    reduce_prompt = PromptTemplate.from_template(reduce_template)
-
-    reduce_chain = reduce_prompt | llm | StrOutputParser()
-
-    # Execute map step
+    # Execute map step, chunks are independent so overlap the round-trips to the model server
     print("Starting map step...")
-    mapped_results = []
-
-    for i, split in enumerate(splits):
-        print(f"Processing chunk {i+1}/{len(splits)}...")
-        result = map_chain.invoke({"text": split.page_content, "stock": stock})
-        mapped_results.append(result)
-        print(f"Chunk {i+1} processed")
+    mapped_results = map_chain.batch(
+        [{"text": chunk, "stock": stock} for chunk in chunks],
+        config=RunnableConfig(max_concurrency=MLX_MAX_CONCURRENCY),
+    )
+    print(f"Processed {len(mapped_results)} chunks")
 
     # Execute reduce step
     print("Starting reduce step...")
-    result = reduce_chain.invoke({"summaries": "\n\n".join(mapped_results) , "stock": stock})
+    result = tree_reduce(
+        reduce_chain,
+        mapped_results,
+        {"stock": stock},
+        max_concurrency=MLX_MAX_CONCURRENCY,
+        on_token=lambda token: print(token, end="", flush=True),
+    )
+    print()
 
     return result
 
 
 def main():
     """Main function to test map-reduce summarization of stock news"""
-    
+    # Imported here, the nasdaq collector pulls in selenium, pandas and trafilatura
+    from src.collectors.nasdaq import fetch_stock_news
+    from langchain_community.cache import SQLiteCache
+    from langchain_core.globals import set_llm_cache
+
+    set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
+
     # Fetch news for NVDA
     print("Fetching news for NVDA...")
     news_items = fetch_stock_news("NVDA")
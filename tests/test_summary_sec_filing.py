@@ -1,12 +1,16 @@
+import asyncio
+import hashlib
+import json
 import sys
+import threading
 import time
-from typing import List
+from functools import lru_cache
+from typing import Dict, List
 import os
 
-from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain.callbacks.tracers import ConsoleCallbackHandler
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,76 +18,46 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from src.logger import get_logger
-from src.ml_serving.utils import get_chat
+from src.ml_serving.utils import atree_reduce, dedupe_texts, estimate_tokens, get_chat, split_texts
+from src.storage.cache import WEEK_TTL, cache_instance
 
 from edgar import Company, set_identity
 logger = get_logger("sec_summary")
 
-def load_sec_filing(company: str) -> List[Document]:
-    """
-    Load SEC filing from the given file path and convert to Document objects
-    using edgar for parsing
-    """
-    try:
-        # Use edgar to parse the SEC filing
-        # Note: This implementation depends on edgar' API - adjust as needed
-        filing = Company(company).latest_tenk
-
-        # Create document
-        docuemnts = [
-            Document(
-                page_content=filing[item],
-                metadata={
-                    "source": "edgar",
-                    "type": filing.form,
-                    "company": filing.company,
-                    "filing_date": filing.filing_date.strftime("%YY-%m-%d"),
-                },
-            )
-            for item in filing.items
-        ]
-        return docuemnts
-    except Exception as e:
-        logger.info(f"Error loading SEC filing: {e}")
-        return []
+SEC_MAX_CONCURRENCY = int(os.getenv("SEC_MAX_CONCURRENCY", "8"))
+SEC_BACKEND = "lmstudio"
+SEC_MODEL = "glm-4-9b-chat-abliterated"
+# Chunk summaries keyed by (prompt, model), re-running a ticker only calls the model for new sections
+LLM_CACHE_PATH = ".sec_llm_cache.db"
+# Short filing items are packed into one map request, up to this many sections and estimated tokens
+SEC_MAP_BATCH_SIZE = 4
+SEC_MAP_BATCH_MAX_TOKENS = 24000
+# Chunk summaries are appended to a checkpoint as they complete, so a crashed run resumes the map step.
+# One file per (model, prompts, chunk size, filing), removed once the map step finishes
+SEC_MAP_CHECKPOINT_TEMPLATE = ".sec_map_{digest}.jsonl"
 
 
-def map_reduce_summarize_sec_filing(documents: List[Document], chunk_size: int = 64000):
-    """Implement map-reduce summarization using langchain with SEC filing-specific prompts"""
-    # Initialize the LLM
-    llm = get_chat(backend="lmstudio", model="glm-4-9b-chat-abliterated")
-
-    # Create text splitter for chunking
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=200,
-        separators=["\n\n", "\n", " ", ""],
-        keep_separator=False
-    )
-
-    # Split documents into chunks
-    splits = []
-    for doc in documents:
-        chunks = text_splitter.split_text(doc.page_content)
-        for chunk in chunks:
-            splits.append(Document(page_content=chunk, metadata=doc.metadata))
-
-    logger.info(f"Split {len(documents)} documents into {len(splits)} chunks")
-
-    # Map: Summarize each chunk
-    map_template = """You are an expert financial analyst specializing in SEC filings.
+# Map: Summarize each chunk
+MAP_TEMPLATE = """You are an expert financial analyst specializing in SEC filings.
     Summarize the following section of an SEC filing, focusing on key financial information, 
     risk factors, business developments, and material changes:
     
     {text}
     
     Provide a concise, factual summary focusing on financial data, significant events, and risks:"""
-    map_prompt = PromptTemplate.from_template(map_template)
+MAP_PROMPT = PromptTemplate.from_template(MAP_TEMPLATE)
+
+# Map: Summarize several short sections in one request
+MAP_BATCH_TEMPLATE = """You are an expert financial analyst specializing in SEC filings.
+    Summarize each SECTION of an SEC filing below independently, focusing on key financial information,
+    risk factors, business developments, and material changes.
+    Return ONLY a JSON list with one object per section: [{{"index": 1, "summary": "..."}}, ...]
 
-    map_chain = map_prompt | llm | StrOutputParser()
+    {sections}"""
+MAP_BATCH_PROMPT = PromptTemplate.from_template(MAP_BATCH_TEMPLATE)
 
-    # Reduce: Combine summaries
-    reduce_template = """You are an expert financial analyst reviewing SEC filings.
+# Reduce: Combine summaries
+REDUCE_TEMPLATE = """You are an expert financial analyst reviewing SEC filings.
     Below are summaries from different sections of an SEC 10-Q filing.
     Create a comprehensive analytical summary that covers:
     
@@ -102,46 +76,227 @@ def map_reduce_summarize_sec_filing(documents: List[Document], chunk_size: int =
     {summaries}
     
     COMPREHENSIVE SEC FILING ANALYSIS:"""
-    reduce_prompt = PromptTemplate.from_template(reduce_template)
+REDUCE_PROMPT = PromptTemplate.from_template(REDUCE_TEMPLATE)
+
+
+@lru_cache(maxsize=4)
+def _sec_chains(backend: str, model: str):
+    """Map, packed map and reduce chains for a chat model, built once per (backend, model)"""
+    llm = get_chat(backend=backend, model=model)
+    return (
+        MAP_PROMPT | llm | StrOutputParser(),
+        MAP_BATCH_PROMPT | llm | StrOutputParser(),
+        REDUCE_PROMPT | llm | StrOutputParser(),
+    )
+
+
+def _group_sections(sections: List[str], batch_size: int, max_tokens: int) -> List[List[int]]:
+    """Group consecutive section indices, at most batch_size per group and within the token budget"""
+    groups = []
+    current = []
+    current_tokens = 0
+    for i, section in enumerate(sections):
+        tokens = estimate_tokens(section)
+        if current and (len(current) >= batch_size or current_tokens + tokens > max_tokens):
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _chunk_key(text: str) -> str:
+    """Content hash identifying a chunk in the map checkpoint"""
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def _map_checkpoint_path(model: str, chunk_size: int, sections: List[str]) -> str:
+    """Checkpoint file for one map run, a changed model, prompt, chunk size or filing starts a new one"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (model, MAP_TEMPLATE, MAP_BATCH_TEMPLATE, str(chunk_size), *sections):
+        digest.update(part.encode())
+        digest.update(b"\x00")
+    return SEC_MAP_CHECKPOINT_TEMPLATE.format(digest=digest.hexdigest())
+
+
+def _load_map_checkpoint(path: str) -> Dict[str, str]:
+    """Load the {chunk key: summary} lines written by a crashed run, stopping at a line cut off by the crash"""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.update(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring truncated line in {path}")
+                break
+    return done
+
+
+def _parse_section_summaries(reply: str, count: int) -> List[str]:
+    """
+    Parse the JSON list of {index, summary} objects returned for a packed map request.
+
+    Raises:
+        ValueError: If the reply isn't such a list or doesn't cover every section
+    """
+    start, end = reply.find("["), reply.rfind("]") + 1
+    if start == -1 or end == 0:
+        raise ValueError("No JSON list found in the response.")
+    items = json.loads(reply[start:end])
+    summaries = {int(item["index"]): item["summary"] for item in items}
+    if sorted(summaries) != list(range(1, count + 1)):
+        raise ValueError(f"Expected summaries for sections 1..{count}, got {sorted(summaries)}")
+    return [summaries[i] for i in range(1, count + 1)]
+
 
-    reduce_chain = reduce_prompt | llm | StrOutputParser()
+def _fetch_latest_tenk_items(company: str) -> List[str]:
+    """Download and parse the latest 10-K from EDGAR"""
+    # Note: This implementation depends on edgar' API - adjust as needed
+    filing = Company(company).latest_tenk
+    logger.info(f"Loaded {filing.form} of {filing.company} filed {filing.filing_date.strftime('%Y-%m-%d')}")
+    return [filing[item] for item in filing.items]
 
-    # Execute map step
-    logger.info("Starting map step...")
-    mapped_results = []
 
-    for i, split in enumerate(splits):
-        logger.info(f"Processing chunk {i+1}/{len(splits)}...")
+@lru_cache(maxsize=64)
+def _latest_tenk_items(company: str) -> List[str]:
+    """
+    The latest 10-K items, kept for a week on disk and for the process in memory.
+    A failed download propagates once and isn't cached; only cache failures are swallowed.
+    """
+    key = f"sec_latest_tenk_items_{company}"
+    try:
+        with cache_instance as cache:
+            items = cache.get(key)
+    except Exception as e:
+        logger.error(f"Cache read failed for {company} 10-K: {e}")
+        items = None
+    if items is not None:
+        return items
+
+    items = _fetch_latest_tenk_items(company)
+    try:
+        with cache_instance as cache:
+            cache.set(key, items, expire=WEEK_TTL)
+    except Exception as e:
+        logger.error(f"Cache write failed for {company} 10-K: {e}")
+    return items
+
+
+def load_sec_filing(company: str) -> List[str]:
+    """
+    Load the latest 10-K of a company with edgar and return the text of each item.
+    Only the text reaches the map step, so no Document or metadata is built per item.
+    """
+    try:
+        # Copy so callers can't mutate the in-memory cached list
+        return list(_latest_tenk_items(company))
+    except Exception as e:
+        logger.info(f"Error loading SEC filing: {e}")
+        return []
 
-        result = map_chain.invoke({"text": split.page_content})
-        logger.info(f"Chunk {i+1} summary: {result}")
-        mapped_results.append(result)
 
-    # Execute reduce step
+def map_reduce_summarize_sec_filing(sections: List[str], chunk_size: int = 64000):
+    """Implement map-reduce summarization using langchain with SEC filing-specific prompts"""
+    map_chain, map_batch_chain, reduce_chain = _sec_chains(SEC_BACKEND, SEC_MODEL)
+
+    # Split sections into chunks
+    splits = split_texts(sections, chunk_size, chunk_overlap=200)
+
+    # Items cross-reference each other and repeat passages, summarize each distinct chunk once
+    chunks, _ = dedupe_texts(splits)
+    logger.info(f"Split {len(sections)} sections into {len(splits)} chunks, {len(chunks)} distinct")
+
+    # Chunks summarized before a crash are read back instead of sent to the model again
+    keys = [_chunk_key(chunk) for chunk in chunks]
+    checkpoint_path = _map_checkpoint_path(SEC_MODEL, chunk_size, sections)
+    done = _load_map_checkpoint(checkpoint_path)
+    pending = [i for i, key in enumerate(keys) if key not in done]
+    logger.info(f"Resuming with {len(chunks) - len(pending)} chunks already summarized")
+    checkpoint_lock = threading.Lock()
+
+    def summarize_chunk(text: str) -> str:
+        return map_chain.invoke({"text": text})
+
+    def summarize_group(group: List[int]) -> List[str]:
+        if len(group) == 1:
+            return [summarize_chunk(chunks[group[0]])]
+        packed = "\n\n".join(f"SECTION {j}:\n{chunks[i]}" for j, i in enumerate(group, 1))
+        try:
+            return _parse_section_summaries(map_batch_chain.invoke({"sections": packed}), len(group))
+        except Exception as e:
+            logger.warning(f"Packed map of {len(group)} sections failed: {e}, summarizing them one by one")
+            return [summarize_chunk(chunks[i]) for i in group]
+
+    def summarize_and_checkpoint(group: List[int]) -> List[str]:
+        summaries = summarize_group(group)
+        lines = "".join(json.dumps({keys[i]: summary}) + "\n" for i, summary in zip(group, summaries))
+        with checkpoint_lock:
+            with open(checkpoint_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            done.update((keys[i], summary) for i, summary in zip(group, summaries))
+        return summaries
+
+    # Execute map step, chunks are independent so keep up to SEC_MAX_CONCURRENCY requests in flight
+    groups = [
+        [pending[j] for j in group]
+        for group in _group_sections([chunks[i] for i in pending], SEC_MAP_BATCH_SIZE, SEC_MAP_BATCH_MAX_TOKENS)
+    ]
+    logger.info(f"Starting map step, {len(pending)} chunks in {len(groups)} requests...")
+    asyncio.run(
+        RunnableLambda(summarize_and_checkpoint).abatch(
+            groups,
+            config={"max_concurrency": SEC_MAX_CONCURRENCY},
+        )
+    )
+    mapped_results = [done[key] for key in keys]
+    # Every chunk is summarized, nothing left to resume
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    for i, result in enumerate(mapped_results):
+        logger.info(f"Chunk {i+1}/{len(chunks)} summary: {result}")
+
+    # Execute reduce step in groups so no prompt outgrows the context, the final level is streamed
     logger.info("Starting reduce step...")
-    result = reduce_chain.invoke({"summaries": "\n\n".join(mapped_results)})
+
+    def write_token(token: str):
+        sys.stdout.write(token)
+        sys.stdout.flush()
+
+    result = asyncio.run(
+        atree_reduce(reduce_chain, mapped_results, max_concurrency=SEC_MAX_CONCURRENCY, on_token=write_token)
+    )
+    sys.stdout.write("\n")
 
     return result
 
 
 def main():
     """Main function to test map-reduce summarization of SEC filing"""
+    from langchain_community.cache import SQLiteCache
+    from langchain_core.globals import set_llm_cache
+
+    set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
     # Set up logger
     set_identity("4k@gmail.com")
 
     # Load SEC filing
     logger.info(f"Loading SEC filing from edgar ...")
-    documents = load_sec_filing("ACHR")
-    logger.info(f"Loaded {len(documents)} documents")
+    sections = load_sec_filing("ACHR")
+    logger.info(f"Loaded {len(sections)} sections")
 
-    if not documents:
-        logger.info("No documents to summarize")
+    if not sections:
+        logger.info("No sections to summarize")
         return
 
     # Run map-reduce summarization
     logger.info("Starting SEC filing summarization...")
     start_time = time.time()
-    summary = map_reduce_summarize_sec_filing(documents)
+    summary = map_reduce_summarize_sec_filing(sections)
     end_time = time.time()
 
     logger.info("\n" + "=" * 80)
@@ -3,10 +3,12 @@ Test module for the technical analysis interpretation functions.
 Uses real stock data to validate interpretation algorithms.
 """
 
+import glob
 import json
 import os
 import sys
 import pprint
+from concurrent.futures import ProcessPoolExecutor
 
 # Add the parent directory to sys.path to allow importing from ta_interpretation
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -23,10 +25,34 @@ from analysis.ta_interpretation import (
     generate_entry_exit_strategy
 )
 
+try:
+    # C parser, several times faster on the fixtures; its decode error subclasses json.JSONDecodeError
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
 def load_test_data(filepath):
-    """Load test data from a JSON file"""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    """Load test data from a JSON or YAML file"""
+    if filepath.endswith(('.yaml', '.yml')):
+        import yaml
+        with open(filepath, 'rb') as f:
+            return yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+    with open(filepath, 'rb') as f:
+        return _json_loads(f.read())
+
+# (result key, interpreter, arguments picked from (indicators, stock_data, current_price))
+INTERPRETERS = [
+    ('rsi_analysis', interpret_rsi, lambda ind, data, price: (ind.get('rsi'),)),
+    ('macd_analysis', interpret_macd, lambda ind, data, price: (ind.get('macd', {}),)),
+    ('ma_analyses', interpret_moving_averages,
+     lambda ind, data, price: (price, ind.get('sma_20'), ind.get('sma_50'), ind.get('sma_100'))),
+    ('bb_analysis', interpret_bollinger_bands, lambda ind, data, price: (price, ind.get('bollinger_bands', {}))),
+    ('adx_analysis', interpret_adx, lambda ind, data, price: (ind.get('adx'),)),
+    ('insider_analysis', interpret_insider_activity, lambda ind, data, price: (data.get('insider_trading', {}),)),
+    ('institutional_analysis', interpret_institutional_holdings,
+     lambda ind, data, price: (data.get('institutional_holdings', {}),)),
+    ('prelim_rating', generate_preliminary_rating, lambda ind, data, price: (data,)),
+]
 
 def test_ta_interpretation(stock_data):
     """Test the technical analysis interpretation functions"""
@@ -44,41 +70,9 @@ def test_ta_interpretation(stock_data):
     recent_date = list(price_data.keys())[0]
     current_price = price_data[recent_date]['close']
     
-    # Test RSI interpretation
-    results['rsi_analysis'] = interpret_rsi(indicators.get('rsi'))
-    
-    # Test MACD interpretation
-    results['macd_analysis'] = interpret_macd(indicators.get('macd', {}))
-    
-    # Test Moving Averages interpretation
-    results['ma_analyses'] = interpret_moving_averages(
-        current_price,
-        indicators.get('sma_20'),
-        indicators.get('sma_50'),
-        indicators.get('sma_100')
-    )
-    
-    # Test Bollinger Bands interpretation
-    results['bb_analysis'] = interpret_bollinger_bands(
-        current_price, 
-        indicators.get('bollinger_bands', {})
-    )
-    
-    # Test ADX interpretation
-    results['adx_analysis'] = interpret_adx(indicators.get('adx'))
-    
-    # Test insider activity interpretation
-    results['insider_analysis'] = interpret_insider_activity(
-        stock_data.get('insider_trading', {})
-    )
-    
-    # Test institutional holdings interpretation
-    results['institutional_analysis'] = interpret_institutional_holdings(
-        stock_data.get('institutional_holdings', {})
-    )
-    
-    # Test preliminary rating
-    results['prelim_rating'] = generate_preliminary_rating(stock_data)
+    # Run every interpreter on its slice of the data
+    for key, interpret, select_args in INTERPRETERS:
+        results[key] = interpret(*select_args(indicators, stock_data, current_price))
     
     # Test entry/exit strategy generation
     entry_strategy, exit_strategy = generate_entry_exit_strategy(stock_data)
@@ -87,78 +81,92 @@ def test_ta_interpretation(stock_data):
     
     return results
 
+SECTION_TEMPLATE = "== {title} ==\nStatus: {status}\nStrength: {strength}\nDescription: {description}\n\n"
+RATING_TEMPLATE = (
+    "== PRELIMINARY RATING ==\n"
+    "Overall Rating: {rating}/100\n"
+    "Technical Score: {technical_score}/70\n"
+    "Fundamental Score: {fundamental_score}/30\n"
+    "Confidence Level: {confidence}/10\n"
+    "\nExplanations:\n"
+)
+ENTRY_TEMPLATE = "== ENTRY STRATEGY ==\nEntry Price: {entry_price}\nEntry Timing: {entry_timing}\nTechnical Indicators:\n"
+EXIT_TEMPLATE = (
+    "== EXIT STRATEGY ==\n"
+    "Profit Target: {profit_target}\n"
+    "Stop Loss: {stop_loss}\n"
+    "Time Horizon: {time_horizon}\n"
+    "Exit Conditions:\n"
+)
+
+def _section(title, analysis):
+    return SECTION_TEMPLATE.format(
+        title=title,
+        status=analysis.get('status', 'N/A'),
+        strength=analysis.get('strength', 'N/A'),
+        description=analysis.get('description', 'N/A'),
+    )
+
+def _fields(template, values, *names):
+    return template.format(**{name: values.get(name, 'N/A') for name in names})
+
+def _bullets(items):
+    return "".join(f"- {item}\n" for item in items)
+
 def print_test_results(results):
-    """Print test results in a readable format"""
-    print("\n=== TECHNICAL ANALYSIS INTERPRETATION TEST RESULTS ===\n")
-    
-    print("== RSI ANALYSIS ==")
-    print(f"Status: {results['rsi_analysis']['status']}")
-    print(f"Strength: {results['rsi_analysis']['strength']}")
-    print(f"Description: {results['rsi_analysis']['description']}")
-    print()
-    
-    print("== MACD ANALYSIS ==")
-    print(f"Status: {results['macd_analysis']['status']}")
-    print(f"Strength: {results['macd_analysis']['strength']}")
-    print(f"Description: {results['macd_analysis']['description']}")
-    print()
-    
-    print("== MOVING AVERAGES ANALYSES ==")
-    for i, ma in enumerate(results['ma_analyses']):
-        print(f"MA {i+1}: {ma['status']} (Strength: {ma['strength']}) - {ma['description']}")
-    print()
-    
-    print("== BOLLINGER BANDS ANALYSIS ==")
-    print(f"Status: {results['bb_analysis']['status']}")
-    print(f"Strength: {results['bb_analysis']['strength']}")
-    print(f"Description: {results['bb_analysis']['description']}")
-    print()
-    
-    print("== ADX ANALYSIS ==")
-    print(f"Status: {results['adx_analysis']['status']}")
-    print(f"Strength: {results['adx_analysis']['strength']}")
-    print(f"Description: {results['adx_analysis']['description']}")
-    print()
-    
-    print("== INSIDER ACTIVITY ANALYSIS ==")
-    print(f"Status: {results['insider_analysis'].get('status', 'N/A')}")
-    print(f"Strength: {results['insider_analysis'].get('strength', 'N/A')}")
-    print(f"Description: {results['insider_analysis'].get('description', 'N/A')}")
-    print()
-    
-    print("== INSTITUTIONAL HOLDINGS ANALYSIS ==")
-    print(f"Status: {results['institutional_analysis'].get('status', 'N/A')}")
-    print(f"Strength: {results['institutional_analysis'].get('strength', 'N/A')}")
-    print(f"Description: {results['institutional_analysis'].get('description', 'N/A')}")
-    print()
-    
-    print("== PRELIMINARY RATING ==")
-    print(f"Overall Rating: {results['prelim_rating'].get('rating', 'N/A')}/100")
-    print(f"Technical Score: {results['prelim_rating'].get('technical_score', 'N/A')}/70")
-    print(f"Fundamental Score: {results['prelim_rating'].get('fundamental_score', 'N/A')}/30")
-    print(f"Confidence Level: {results['prelim_rating'].get('confidence', 'N/A')}/10")
-    print("\nExplanations:")
-    for exp in results['prelim_rating'].get('explanations', []):
-        print(f"- {exp}")
-    print()
-    
-    print("== ENTRY STRATEGY ==")
-    print(f"Entry Price: {results['entry_strategy'].get('entry_price', 'N/A')}")
-    print(f"Entry Timing: {results['entry_strategy'].get('entry_timing', 'N/A')}")
-    print("Technical Indicators:")
-    for indicator in results['entry_strategy'].get('technical_indicators', []):
-        print(f"- {indicator}")
-    print()
-    
-    print("== EXIT STRATEGY ==")
-    print(f"Profit Target: {results['exit_strategy'].get('profit_target', 'N/A')}")
-    print(f"Stop Loss: {results['exit_strategy'].get('stop_loss', 'N/A')}")
-    print(f"Time Horizon: {results['exit_strategy'].get('time_horizon', 'N/A')}")
-    print("Exit Conditions:")
-    for condition in results['exit_strategy'].get('exit_conditions', []):
-        print(f"- {condition}")
+    """Print test results in a readable format, in one buffered write"""
+    entry, exit_ = results['entry_strategy'], results['exit_strategy']
+    parts = [
+        "\n=== TECHNICAL ANALYSIS INTERPRETATION TEST RESULTS ===\n\n",
+        _section("RSI ANALYSIS", results['rsi_analysis']),
+        _section("MACD ANALYSIS", results['macd_analysis']),
+        "== MOVING AVERAGES ANALYSES ==\n",
+        "".join(
+            f"MA {i+1}: {ma['status']} (Strength: {ma['strength']}) - {ma['description']}\n"
+            for i, ma in enumerate(results['ma_analyses'])
+        ),
+        "\n",
+        _section("BOLLINGER BANDS ANALYSIS", results['bb_analysis']),
+        _section("ADX ANALYSIS", results['adx_analysis']),
+        _section("INSIDER ACTIVITY ANALYSIS", results['insider_analysis']),
+        _section("INSTITUTIONAL HOLDINGS ANALYSIS", results['institutional_analysis']),
+        _fields(RATING_TEMPLATE, results['prelim_rating'], 'rating', 'technical_score', 'fundamental_score', 'confidence'),
+        _bullets(results['prelim_rating'].get('explanations', [])),
+        "\n",
+        _fields(ENTRY_TEMPLATE, entry, 'entry_price', 'entry_timing'),
+        _bullets(entry.get('technical_indicators', [])),
+        "\n",
+        _fields(EXIT_TEMPLATE, exit_, 'profit_target', 'stop_loss', 'time_horizon'),
+        _bullets(exit_.get('exit_conditions', [])),
+    ]
+    sys.stdout.write("".join(parts))
+    sys.stdout.flush()
+
+def _run_one(path):
+    """Run the interpretation test on one fixture file, top level so worker processes can unpickle it"""
+    return test_ta_interpretation(load_test_data(path))
+
+def run_all_fixtures(pattern=None):
+    """
+    Run the interpretation test on every dated fixture in parallel.
+    The interpreters are pure Python and hold the GIL, so each fixture runs in its own process.
+    """
+    tests_dir = os.path.dirname(os.path.abspath(__file__))
+    files = sorted(glob.glob(pattern or os.path.join(tests_dir, '*_20*.json')) +
+                   ([] if pattern else glob.glob(os.path.join(tests_dir, '*_20*.yaml'))))
+    with ProcessPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1) or 1) as executor:
+        for path, results in zip(files, executor.map(_run_one, files)):
+            print(f"\n##### {os.path.basename(path)} #####")
+            if results:
+                print_test_results(results)
+            else:
+                print("Test failed to produce results")
 
 if __name__ == "__main__":
+    if "--all" in sys.argv:
+        run_all_fixtures()
+        sys.exit(0)
+
     # Path to test data
     achr_data_path = os.path.join(
         os.path.dirname(os.path.dirname(__file__)), 
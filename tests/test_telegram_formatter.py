@@ -1,6 +1,8 @@
 import os
 import sys
+import time
 
+import pytest
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from telegram import format_investment_message
@@ -70,5 +72,39 @@ def test_message_formatter():
 
     print("All tests passed!")
 
+# Strategy dicts are rendered key by key, internal fields inside them must be dropped too
+NESTED_TEST_DATA = {
+    "symbol": "ASTS",
+    "rating": 85,
+    "confidence": 8,
+    "reasoning": "Strong momentum & rising volume.",
+    "bullish_factors": ["RSI at 62.28", "MACD crossover"],
+    "bearish_factors": ["High debt"],
+    "enter_strategy": {"entry_price": "$33.40", "request_id": "sentiment_1741615213.591004"},
+    "exit_strategy": {"stop_loss": "$24.78", "exit_conditions": ["Close below the 100-day SMA."]},
+    "request_id": "sentiment_1741615213.591004",
+    "requested_by": "-4614455844",
+}
+
+def test_message_formatter_nested_internal_fields():
+    """Internal fields are filtered out of nested strategy dicts, not only the top level"""
+    formatted_message = format_investment_message(NESTED_TEST_DATA)
+    assert "request_id" not in formatted_message.lower().replace(" ", "_"), "Nested internal field leaked"
+    assert "requested_by" not in formatted_message.lower().replace(" ", "_"), "Internal field leaked"
+    assert "$33.40" in formatted_message, "Nested strategy value missing"
+
+@pytest.mark.benchmark
+def test_message_formatter_speed():
+    """
+    Opt-in timing check, run with `pytest -m benchmark`.
+    The formatter runs on every broadcast, 10k messages should take well under 2s.
+    """
+    start = time.perf_counter()
+    for _ in range(10000):
+        format_investment_message(NESTED_TEST_DATA)
+    assert time.perf_counter() - start < 2.0, "format_investment_message regressed"
+
 if __name__ == "__main__":
     test_message_formatter()
+    test_message_formatter_nested_internal_fields()
+    test_message_formatter_speed()
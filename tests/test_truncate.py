@@ -0,0 +1,17 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ml_serving import utils
+from src.ml_serving.utils import truncate_to_tokens
+
+
+def test_truncate_without_tiktoken(monkeypatch):
+    # A None entry makes `import tiktoken` raise ImportError, like a failed BPE download would fail the load
+    monkeypatch.setitem(sys.modules, "tiktoken", None)
+    utils._token_encoding.cache_clear()
+    try:
+        assert truncate_to_tokens("a" * 100, max_tokens=10) == "a" * 40
+        assert truncate_to_tokens("short", max_tokens=10) == "short"
+    finally:
+        utils._token_encoding.cache_clear()